@@ -24,13 +24,13 @@ from rpcclient.exceptions import ArgumentError, SymbolAbsentError, SpawnError, S
     InvalidServerVersionMagicError, BadReturnValueError, RpcFileExistsError, RpcNotEmptyError, RpcFileNotFoundError, \
     RpcBrokenPipeError, RpcIsADirectoryError, RpcPermissionError, RpcNotADirectoryError, \
     RpcResourceTemporarilyUnavailableError, RpcConnectionRefusedError
-from rpcclient.fs import Fs
+from rpcclient.fs import Fs, File
 from rpcclient.lief import Lief
 from rpcclient.network import Network
 from rpcclient.processes import Processes
 from rpcclient.protocol import protocol_message_t, cmd_type_t, exec_chunk_t, exec_chunk_type_t, \
     reply_protocol_message_t, dummy_block_t, SERVER_MAGIC_VERSION, argument_type_t, call_response_t, arch_t, \
-    protocol_handshake_t, call_response_t_size, listdir_entry_t, MAGIC
+    protocol_handshake_t, call_response_t_size, listdir_entry_t, walk_dir_t, MAGIC, MAX_PEEK_MANY_REGIONS
 from rpcclient.structs.consts import EEXIST, ENOTEMPTY, ENOENT, EPIPE, EISDIR, EPERM, ENOTDIR, EAGAIN, ECONNREFUSED
 from rpcclient.symbol import Symbol
 from rpcclient.symbols_jar import SymbolsJar
@@ -51,6 +51,8 @@ SpawnResult = namedtuple('SpawnResult', 'error pid stdout')
 
 INVALID_PID = 0xffffffff
 CHUNK_SIZE = 1024
+BUILTIN_NAMES = frozenset(dir(builtins))
+SYMBOLS_JAR_NAMES = frozenset(dir(SymbolsJar))
 
 USAGE = '''
 Welcome to the rpcclient interactive shell! You interactive shell for controlling the remote rpcserver.
@@ -91,11 +93,24 @@ class ProtocolDirent:
     stat: ProtocolDitentStat
 
 
+class NameCollector(ast.NodeVisitor):
+    """ collect all names loaded by an AST """
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_Name(self, node: ast.Name):
+        # names which are only assigned to don't need to be resolved
+        if isinstance(node.ctx, ast.Load):
+            self.names.add(node.id)
+
+
 class Client:
     """ Main client interface to access remote rpcserver """
 
     DEFAULT_ARGV = ['/bin/sh']
     DEFAULT_ENVP = []
+    MAX_FILE_CHUNK_SIZE = 1024 * 1024 * 16
 
     def __init__(self, sock, sysname: str, arch: arch_t, create_socket_cb: typing.Callable):
         self._arch = arch
@@ -206,24 +221,16 @@ class Client:
                 tmp.poke(arg)
                 free_list.append(tmp)
 
-            if isinstance(tmp, int):
-                tmp &= 0xffffffffffffffff
-                fixed_argv.append({'type': argument_type_t.Integer, 'value': tmp})
-
-            elif isinstance(tmp, float):
-                fixed_argv.append({'type': argument_type_t.Double, 'value': tmp})
-
-            else:
+            if not isinstance(tmp, (int, float)):
                 raise ArgumentError(f'invalid parameter type: {arg}')
 
-        message = protocol_message_t.build({
-            'cmd_type': cmd_type_t.CMD_CALL,
-            'data': {'address': address, 'va_list_index': va_list_index, 'argv': fixed_argv},
-        })
+            fixed_argv.append(tmp)
+
+        message = self._build_call_message(address, fixed_argv, va_list_index)
 
         with self._protocol_lock:
             self._sock.sendall(message)
-            response = call_response_t.parse(self._recvall(call_response_t_size))
+            response = self._recv_call_response()
 
         for f in free_list:
             self.symbols.free(f)
@@ -246,22 +253,67 @@ class Client:
             if return_raw:
                 return response.return_values.arm_registers
 
-            return self.symbol(response.return_values.arm_registers.x[0])
-
-        return self.symbol(response.return_values.return_value)
+        return self.symbol(self._call_response_value(response))
 
     def peek(self, address: int, size: int) -> bytes:
         """ peek data at given address """
-        message = protocol_message_t.build({
-            'cmd_type': cmd_type_t.CMD_PEEK,
-            'data': {'address': address, 'size': size},
-        })
+        with self._protocol_lock:
+            self._sock.sendall(self._build_peek_message(address, size))
+            return bytes(self._recv_peek_response(address, size))
+
+    def peek_many(self, regions: typing.Iterable[typing.Tuple[int, int]]) -> typing.List[bytes]:
+        """ peek data at many (address, size) regions using a single request per MAX_PEEK_MANY_REGIONS regions """
+        regions = [(int(address), size) for address, size in regions]
+
+        result = []
+        failed = []
+        for i in range(0, len(regions), MAX_PEEK_MANY_REGIONS):
+            batch = regions[i:i + MAX_PEEK_MANY_REGIONS]
+            message = protocol_message_t.build({
+                'cmd_type': cmd_type_t.CMD_PEEK_MANY,
+                'data': {'regions': [{'address': address, 'size': size} for address, size in batch]},
+            })
+
+            with self._protocol_lock:
+                self._sock.sendall(message)
+                # all replies must be consumed, even after a failure
+                for address, size in batch:
+                    reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
+                    if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+                        failed.append((address, size))
+                    else:
+                        result.append(bytes(self._recvall(size)))
+
+        if failed:
+            address, size = failed[0]
+            raise ArgumentError(f'failed to read {size} bytes from {address}')
+        return result
+
+    def call_and_peek(self, address: int, calls: typing.Iterable[typing.Tuple[typing.List[int], int, int]]) \
+            -> typing.List[typing.Tuple[Symbol, bytes]]:
+        """ call a remote function with each (argv, peek_address, peek_size) and peek after each call """
+        # all requests are sent at once. the server handles them in order, so each peek sees its call's writes
+        calls = [(argv, int(peek_address), size) for argv, peek_address, size in calls]
+        message = b''.join(self._build_call_message(address, argv) + self._build_peek_message(peek_address, size)
+                           for argv, peek_address, size in calls)
+
+        result = []
+        failed = []
         with self._protocol_lock:
             self._sock.sendall(message)
-            reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
-            if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
-                raise ArgumentError(f'failed to read {size} bytes from {address}')
-            return self._recvall(size)
+            # all replies must be consumed, even after a failure
+            for _, peek_address, size in calls:
+                value = self._call_response_value(self._recv_call_response())
+                reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
+                if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+                    failed.append((peek_address, size))
+                    continue
+                result.append((self.symbol(value), bytes(self._recvall(size))))
+
+        if failed:
+            peek_address, size = failed[0]
+            raise ArgumentError(f'failed to read {size} bytes from {peek_address}')
+        return result
 
     def poke(self, address: int, data: bytes):
         """ poke data at given address """
@@ -299,32 +351,125 @@ class Client:
         with self._protocol_lock:
             self._sock.sendall(message)
             dirp = Int64ul.parse(self._recvall(Int64ul.sizeof()))
-            while dirp:
-                magic = Int64ul.parse(self._recvall(Int64ul.sizeof()))
-                if magic != MAGIC:
-                    break
-                entry = listdir_entry_t.parse(self._recvall(listdir_entry_t.sizeof()))
-                name = self._recvall(entry.d_namlen).decode()
-                lstat = ProtocolDitentStat(
-                    errno=entry.lstat.errno, st_blocks=entry.lstat.st_blocks, st_blksize=entry.lstat.st_blksize,
-                    st_atime=entry.lstat.st_atime, st_ctime=entry.lstat.st_ctime, st_mtime=entry.lstat.st_mtime,
-                    st_nlink=entry.lstat.st_nlink, st_mode=entry.lstat.st_mode, st_rdev=entry.lstat.st_rdev,
-                    st_size=entry.lstat.st_size, st_dev=entry.lstat.st_dev, st_gid=entry.lstat.st_gid,
-                    st_ino=entry.lstat.st_ino, st_uid=entry.lstat.st_uid)
-                stat = ProtocolDitentStat(
-                    errno=entry.stat.errno, st_blocks=entry.stat.st_blocks, st_blksize=entry.stat.st_blksize,
-                    st_atime=entry.stat.st_atime, st_ctime=entry.stat.st_ctime, st_mtime=entry.stat.st_mtime,
-                    st_nlink=entry.stat.st_nlink, st_mode=entry.stat.st_mode, st_rdev=entry.stat.st_rdev,
-                    st_size=entry.stat.st_size, st_dev=entry.stat.st_dev, st_gid=entry.stat.st_gid,
-                    st_ino=entry.stat.st_ino, st_uid=entry.stat.st_uid)
-                entries.append(ProtocolDirent(d_inode=entry.lstat.st_ino, d_type=entry.d_type, d_name=name, lstat=lstat,
-                                              stat=stat))
+            if dirp:
+                entries = self._recv_listdir_entries()
 
         if not dirp:
             self.raise_errno_exception(f'failed to listdir: {filename}')
 
         return entries
 
+    def listdir_recursive(self, filename: str, depth: int) \
+            -> typing.Dict[str, typing.Tuple[int, typing.List[ProtocolDirent]]]:
+        """
+        list a directory tree (without following symlinks) using a single request
+
+        :param filename: top directory
+        :param depth: number of directory levels to list below the top one
+        :return: a mapping between each listed directory to its (errno, entries) excluding '.' and '..'
+        """
+        message = protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_WALK,
+            'data': {'filename': filename, 'depth': depth},
+        })
+
+        result = {}
+        with self._protocol_lock:
+            self._sock.sendall(message)
+            while Int64ul.parse(self._recvall(Int64ul.sizeof())) == MAGIC:
+                header = walk_dir_t.parse(self._recvall(walk_dir_t.sizeof()))
+                path = self._recvall(header.pathlen).decode()
+                entries = []
+                if not header.errno:
+                    entries = self._recv_listdir_entries()
+                result[path] = (header.errno, entries)
+
+        return result
+
+    def read_file(self, filename: str, chunk_size: int = File.CHUNK_SIZE) -> bytes:
+        """
+        read a whole remote file using a single request
+
+        :param filename: remote filename
+        :param chunk_size: size of each read() done by the server, 0 for the server's default
+        """
+        buf = bytearray()
+        self.read_file_into(filename, buf, chunk_size=chunk_size)
+        return bytes(buf)
+
+    def read_file_into(self, filename: str, dst: typing.Union[bytearray, typing.BinaryIO],
+                       chunk_size: int = File.CHUNK_SIZE):
+        """
+        read a whole remote file using a single request, streaming its contents into dst
+
+        :param filename: remote filename
+        :param dst: either a bytearray to append to or a writable binary file object
+        :param chunk_size: size of each read() done by the server, 0 for the server's default
+        """
+        if not 0 <= chunk_size <= self.MAX_FILE_CHUNK_SIZE:
+            raise ArgumentError(f'invalid chunk_size: {chunk_size}')
+
+        write = dst.extend if isinstance(dst, bytearray) else dst.write
+        message = protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_READ_FILE,
+            'data': {'filename': filename, 'chunk_size': chunk_size},
+        })
+
+        view = memoryview(bytearray(chunk_size or File.CHUNK_SIZE))
+        write_error = None
+        with self._protocol_lock:
+            self._sock.sendall(message)
+            while True:
+                reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
+                if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+                    break
+                size = Int64ul.parse(self._recvall(Int64ul.sizeof()))
+                if not size:
+                    break
+                if size > len(view):
+                    view = memoryview(bytearray(size))
+                self._recvall_into(view[:size])
+
+                # the rest of the file must still be received after a local write error
+                if write_error is None:
+                    try:
+                        write(view[:size])
+                    except Exception as e:
+                        write_error = e
+
+        if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+            self.raise_errno_exception(f'failed to read: {filename}')
+
+        if write_error is not None:
+            raise write_error
+
+    def write_file(self, filename: str, buf: bytes, access: int = 0o777, chunk_size: int = File.CHUNK_SIZE):
+        """
+        write a whole remote file using a single request
+
+        :param filename: remote filename
+        :param buf: file contents
+        :param access: access mode as octal value
+        :param chunk_size: size of each write() done by the server, 0 for the server's default
+        """
+        if not 0 <= chunk_size <= self.MAX_FILE_CHUNK_SIZE:
+            raise ArgumentError(f'invalid chunk_size: {chunk_size}')
+        if isinstance(buf, str):
+            buf = buf.encode()
+
+        message = protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_WRITE_FILE,
+            'data': {'filename': filename, 'access': access, 'chunk_size': chunk_size, 'size': len(buf),
+                     'data': buf},
+        })
+
+        with self._protocol_lock:
+            self._sock.sendall(message)
+            reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
+
+        if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+            self.raise_errno_exception(f'failed to write: {filename}')
+
     def spawn(self, argv: typing.List[str] = None, envp: typing.List[str] = None, stdin: io_or_str = sys.stdin,
               stdout=sys.stdout, raw_tty=False, background=False) -> SpawnResult:
         """
@@ -471,26 +616,25 @@ class Client:
         if info.raw_cell.startswith('!') or info.raw_cell.endswith('?'):
             return
 
-        for node in ast.walk(ast.parse(info.raw_cell)):
-            if not isinstance(node, ast.Name):
-                # we are only interested in names
-                continue
+        self._ipython_resolve_names(self._ipython_undefined_names(info.raw_cell))
 
-            if node.id in locals() or node.id in globals() or node.id in dir(builtins):
-                # That are undefined
-                continue
+    def _ipython_undefined_names(self, cell: str) -> typing.Set[str]:
+        """ get the distinct names used by an IPython cell which aren't defined in the shell's namespace """
+        collector = NameCollector()
+        collector.visit(ast.parse(cell))
 
-            if not hasattr(SymbolsJar, node.id):
-                # ignore SymbolsJar properties
-                try:
-                    symbol = getattr(self.symbols, node.id)
-                except SymbolAbsentError:
-                    pass
-                else:
-                    self._add_global(
-                        node.id,
-                        symbol
-                    )
+        # the shell's namespace is this module's globals
+        return collector.names - globals().keys() - BUILTIN_NAMES - SYMBOLS_JAR_NAMES
+
+    def _ipython_resolve_names(self, names: typing.Set[str]):
+        """ add the symbols matching the given names as globals """
+        for name in names:
+            try:
+                symbol = getattr(self.symbols, name)
+            except SymbolAbsentError:
+                pass
+            else:
+                self._add_global(name, symbol)
 
     def _close(self):
         message = protocol_message_t.build({
@@ -558,19 +702,80 @@ class Client:
         self._old_settings = termios.tcgetattr(fd)
         tty.setraw(fd)
 
-    def _recvall(self, size: int) -> bytes:
-        buf = b''
-        while size:
+    def _build_call_message(self, address: int, argv: typing.List[typing.Union[int, float]],
+                            va_list_index: int = 0xffff) -> bytes:
+        """ build a CMD_CALL message for a list of integer and float arguments """
+        fixed_argv = [{'type': argument_type_t.Double, 'value': arg} if isinstance(arg, float) else
+                      {'type': argument_type_t.Integer, 'value': arg & 0xffffffffffffffff} for arg in argv]
+        return protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_CALL,
+            'data': {'address': address, 'va_list_index': va_list_index, 'argv': fixed_argv},
+        })
+
+    def _recv_call_response(self):
+        return call_response_t.parse(self._recvall(call_response_t_size))
+
+    def _call_response_value(self, response) -> int:
+        """ get the integer return value out of a parsed call_response_t """
+        if self.arch == arch_t.ARCH_ARM64:
+            return response.return_values.arm_registers.x[0]
+        return response.return_values.return_value
+
+    @staticmethod
+    def _build_peek_message(address: int, size: int) -> bytes:
+        return protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_PEEK,
+            'data': {'address': address, 'size': size},
+        })
+
+    def _recv_peek_response(self, address: int, size: int) -> bytearray:
+        reply = protocol_message_t.parse(self._recvall(reply_protocol_message_t.sizeof()))
+        if reply.cmd_type == cmd_type_t.CMD_REPLY_ERROR:
+            raise ArgumentError(f'failed to read {size} bytes from {address}')
+        return self._recvall(size)
+
+    def _recv_listdir_entries(self) -> typing.List[ProtocolDirent]:
+        entries = []
+        while Int64ul.parse(self._recvall(Int64ul.sizeof())) == MAGIC:
+            entry = listdir_entry_t.parse(self._recvall(listdir_entry_t.sizeof()))
+            name = self._recvall(entry.d_namlen).decode()
+            lstat = ProtocolDitentStat(
+                errno=entry.lstat.errno, st_blocks=entry.lstat.st_blocks, st_blksize=entry.lstat.st_blksize,
+                st_atime=entry.lstat.st_atime, st_ctime=entry.lstat.st_ctime, st_mtime=entry.lstat.st_mtime,
+                st_nlink=entry.lstat.st_nlink, st_mode=entry.lstat.st_mode, st_rdev=entry.lstat.st_rdev,
+                st_size=entry.lstat.st_size, st_dev=entry.lstat.st_dev, st_gid=entry.lstat.st_gid,
+                st_ino=entry.lstat.st_ino, st_uid=entry.lstat.st_uid)
+            stat = ProtocolDitentStat(
+                errno=entry.stat.errno, st_blocks=entry.stat.st_blocks, st_blksize=entry.stat.st_blksize,
+                st_atime=entry.stat.st_atime, st_ctime=entry.stat.st_ctime, st_mtime=entry.stat.st_mtime,
+                st_nlink=entry.stat.st_nlink, st_mode=entry.stat.st_mode, st_rdev=entry.stat.st_rdev,
+                st_size=entry.stat.st_size, st_dev=entry.stat.st_dev, st_gid=entry.stat.st_gid,
+                st_ino=entry.stat.st_ino, st_uid=entry.stat.st_uid)
+            entries.append(ProtocolDirent(d_inode=entry.lstat.st_ino, d_type=entry.d_type, d_name=name, lstat=lstat,
+                                          stat=stat))
+        return entries
+
+    def _recvall(self, size: int) -> bytearray:
+        """
+        receive exactly size bytes from the server
+
+        the buffer received into is returned as is, so callers handing it out to the user should convert it to bytes
+        """
+        buf = bytearray(size)
+        self._recvall_into(memoryview(buf))
+        return buf
+
+    def _recvall_into(self, view: memoryview):
+        """ fill the given buffer with data received from the server """
+        while view:
             try:
-                chunk = self._sock.recv(size)
+                received = self._sock.recv_into(view)
             except BlockingIOError:
                 continue
-            if self._sock.gettimeout() == 0 and not chunk:
-                # TODO: replace self._sock.gettimeout() == 0 on -> self._sock.getblocking() on python37+
+            if not received:
+                # an empty read means the connection was closed, whether the socket is blocking or not
                 raise ServerDiedError()
-            size -= len(chunk)
-            buf += chunk
-        return buf
+            view = view[received:]
 
     def _execution_loop(self, stdin: io_or_str = sys.stdin, stdout=sys.stdout):
         """
@@ -1,14 +1,10 @@
-import ast
-import builtins
-import json
 import plistlib
 import typing
 from collections import namedtuple
-from functools import lru_cache
 from typing import Mapping
 
 from cached_property import cached_property
-from construct import Int64sl
+from construct import Int64sl, Int32ul, Int64ul, Array
 
 from rpcclient.client import Client
 from rpcclient.darwin import objective_c_class
@@ -32,21 +28,30 @@ from rpcclient.darwin.symbol import DarwinSymbol
 from rpcclient.darwin.syslog import Syslog
 from rpcclient.darwin.time import Time
 from rpcclient.darwin.xpc import Xpc
-from rpcclient.exceptions import RpcClientException, MissingLibraryError, GettingObjectiveCClassError
+from rpcclient.exceptions import RpcClientException, MissingLibraryError, BadReturnValueError
 from rpcclient.protocol import arch_t, protocol_message_t, cmd_type_t
 from rpcclient.structs.consts import RTLD_NOW
 from rpcclient.symbol import Symbol
-from rpcclient.symbols_jar import SymbolsJar
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 IsaMagic = namedtuple('IsaMagic', 'mask value')
-ISA_MAGICS = [
+ISA_MAGICS = (
     # ARM64
     IsaMagic(mask=0x000003f000000001, value=0x000001a000000001),
     # X86_64
     IsaMagic(mask=0x001f800000000001, value=0x001d800000000001),
-]
+)
 # Mask for tagged pointer, from objc-internal.h
 OBJC_TAG_MASK = (1 << 63)
+# Addresses below it are never mapped, so they can't point to an ObjC object
+MIN_OBJC_ADDRESS = 0x1000
+
+COMPILED_UTSNAME = utsname.compile()
+COMPILED_INT64SL = Int64sl.compile()
 
 
 class DarwinClient(Client):
@@ -58,6 +63,9 @@ class DarwinClient(Client):
     def _init_process_specific(self):
         super(DarwinClient, self)._init_process_specific()
 
+        # class objects are only valid within the process they were resolved in
+        self._objc_class_cache = {}
+
         if 0 == self.dlopen("/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation", RTLD_NOW):
             raise MissingLibraryError('failed to load CoreFoundation')
 
@@ -79,16 +87,26 @@ class DarwinClient(Client):
 
     @property
     def modules(self) -> typing.List[str]:
+        """ get the names of all loaded images using a single request """
+        message = protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_DYLD_LIST,
+            'data': None,
+        })
         m = []
-        for i in range(self.symbols._dyld_image_count()):
-            m.append(self.symbols._dyld_get_image_name(i).peek_str())
+        with self._protocol_lock:
+            self._sock.sendall(message)
+            count = Int32ul.parse(self._recvall(Int32ul.sizeof()))
+            for _ in range(count):
+                name = self._recvall(Int32ul.parse(self._recvall(Int32ul.sizeof()))).decode()
+                if name:
+                    m.append(name)
         return m
 
     @cached_property
     def uname(self):
         with self.safe_calloc(utsname.sizeof()) as uname:
             assert 0 == self.symbols.uname(uname)
-            return utsname.parse_stream(uname)
+            return COMPILED_UTSNAME.parse(uname.peek(utsname.sizeof()))
 
     @cached_property
     def is_idevice(self):
@@ -106,9 +124,9 @@ class DarwinClient(Client):
         })
         with self._protocol_lock:
             self._sock.sendall(message)
-            response_len = Int64sl.parse(self._recvall(Int64sl.sizeof()))
+            response_len = COMPILED_INT64SL.parse(self._recvall(Int64sl.sizeof()))
             response = self._recvall(response_len)
-        return json.loads(response)
+        return json_loads(response)
 
     def showclass(self, class_address: Symbol) -> Mapping:
         message = protocol_message_t.build({
@@ -117,9 +135,9 @@ class DarwinClient(Client):
         })
         with self._protocol_lock:
             self._sock.sendall(message)
-            response_len = Int64sl.parse(self._recvall(Int64sl.sizeof()))
+            response_len = COMPILED_INT64SL.parse(self._recvall(Int64sl.sizeof()))
             response = self._recvall(response_len)
-        return json.loads(response)
+        return json_loads(response)
 
     def symbol(self, symbol: int):
         """ at a symbol object from a given address """
@@ -130,10 +148,11 @@ class DarwinClient(Client):
             symbol, CFPropertyListFormat.kCFPropertyListBinaryFormat_v1_0, 0, 0)
         if objc_data == 0:
             return None
-        count = self.symbols.CFDataGetLength(objc_data)
-        result = plistlib.loads(self.symbols.CFDataGetBytePtr(objc_data).peek(count))
-        objc_data.objc_call('release')
-        return result
+        try:
+            count = self.symbols.CFDataGetLength(objc_data)
+            return plistlib.loads(self.symbols.CFDataGetBytePtr(objc_data).peek(count))
+        finally:
+            objc_data.objc_call('release')
 
     def cf(self, o: CfSerializable) -> DarwinSymbol:
         """ construct a CFObject from a given python object """
@@ -141,9 +160,25 @@ class DarwinClient(Client):
             return self.symbols.kCFNull[0]
 
         plist_bytes = plistlib.dumps(o, fmt=plistlib.FMT_BINARY)
-        plist_objc_bytes = self.symbols.CFDataCreate(kCFAllocatorDefault, plist_bytes, len(plist_bytes))
-        return self._NSPropertyListSerialization.propertyListWithData_options_format_error_(
-            plist_objc_bytes, CFPropertyListMutabilityOptions.kCFPropertyListMutableContainersAndLeaves, 0, 0)
+        buf = self.symbols.malloc(len(plist_bytes))
+        try:
+            buf.poke(plist_bytes)
+        except Exception:
+            self.symbols.free(buf)
+            raise
+
+        # the CFData takes ownership over buf instead of copying it, and frees it once released
+        plist_objc_bytes = self.symbols.CFDataCreateWithBytesNoCopy(kCFAllocatorDefault, buf, len(plist_bytes),
+                                                                    self.symbols.kCFAllocatorMalloc[0])
+        if not plist_objc_bytes:
+            self.symbols.free(buf)
+            raise BadReturnValueError('CFDataCreateWithBytesNoCopy() failed')
+
+        try:
+            return self._NSPropertyListSerialization.propertyListWithData_options_format_error_(
+                plist_objc_bytes, CFPropertyListMutabilityOptions.kCFPropertyListMutableContainersAndLeaves, 0, 0)
+        finally:
+            self.symbols.CFRelease(plist_objc_bytes)
 
     def objc_symbol(self, address) -> ObjectiveCSymbol:
         """
@@ -153,14 +188,51 @@ class DarwinClient(Client):
         """
         return ObjectiveCSymbol.create(int(address), self)
 
-    @lru_cache(maxsize=None)
     def objc_get_class(self, name: str):
         """
         Get ObjC class object
         :param name:
         :return:
         """
-        return objective_c_class.Class.from_class_name(self, name)
+        cls = self._objc_class_cache.get(name)
+        if cls is None:
+            cls = objective_c_class.Class.from_class_name(self, name)
+            self._objc_class_cache[name] = cls
+        return cls
+
+    def objc_get_classes(self, names: typing.Iterable[str]) -> typing.Mapping[str, objective_c_class.Class]:
+        """
+        Get ObjC class objects for many names, looking up the uncached ones using a single request
+        :param names:
+        :return: mapping between each existing class name to its class object
+        """
+        result = {}
+        lookup = []
+        for name in names:
+            cls = self._objc_class_cache.get(name)
+            if cls is None:
+                lookup.append(name)
+            else:
+                result[name] = cls
+
+        if not lookup:
+            return result
+
+        message = protocol_message_t.build({
+            'cmd_type': cmd_type_t.CMD_OBJC_GET_CLASSES,
+            'data': {'names': lookup},
+        })
+        with self._protocol_lock:
+            self._sock.sendall(message)
+            addresses = Array(len(lookup), Int64ul).parse(self._recvall(len(lookup) * Int64ul.sizeof()))
+
+        for name, address in zip(lookup, addresses):
+            if not address:
+                continue
+            cls = objective_c_class.Class(self, self.symbol(address))
+            self._objc_class_cache[name] = cls
+            result[name] = cls
+        return result
 
     @staticmethod
     def is_objc_type(symbol: DarwinSymbol) -> bool:
@@ -169,18 +241,25 @@ class DarwinClient(Client):
         :param symbol:
         :return:
         """
+        # work on plain ints, since every operation on a Symbol creates a new one
+        address = int(symbol)
+
         # Tagged pointers are ObjC objects
-        if symbol & OBJC_TAG_MASK == OBJC_TAG_MASK:
+        if address & OBJC_TAG_MASK == OBJC_TAG_MASK:
             return True
 
+        # NULL and small scalars can be ruled out without reading remote memory
+        if address < MIN_OBJC_ADDRESS:
+            return False
+
         # Class are not ObjC objects
         for mask, value in ISA_MAGICS:
-            if symbol & mask == value:
+            if address & mask == value:
                 return False
 
         try:
             with symbol.change_item_size(8):
-                isa = symbol[0]
+                isa = int(symbol[0])
         except RpcClientException:
             return False
 
@@ -190,33 +269,10 @@ class DarwinClient(Client):
 
         return False
 
-    def _ipython_run_cell_hook(self, info):
-        """
-        Enable lazy loading for symbols
-        :param info: IPython's CellInf4o object
-        """
-        super()._ipython_run_cell_hook(info)
-
-        if info.raw_cell.startswith('!') or info.raw_cell.endswith('?'):
-            return
-
-        for node in ast.walk(ast.parse(info.raw_cell)):
-            if not isinstance(node, ast.Name):
-                # we are only interested in names
-                continue
-
-            if node.id in locals() or node.id in globals() or node.id in dir(builtins):
-                # That are undefined
-                continue
+    def _ipython_resolve_names(self, names: typing.Set[str]):
+        """ add the symbols and ObjC classes matching the given names as globals """
+        # classes are added last so they take precedence over symbols of the same name
+        super()._ipython_resolve_names(names)
 
-            if not hasattr(SymbolsJar, node.id):
-                # ignore SymbolsJar properties
-                try:
-                    symbol = self.objc_get_class(node.id)
-                except GettingObjectiveCClassError:
-                    pass
-                else:
-                    self._add_global(
-                        node.id,
-                        symbol
-                    )
+        for name, cls in self.objc_get_classes(names).items():
+            self._add_global(name, cls)
@@ -3,13 +3,13 @@ import errno
 import posixpath
 import re
 import struct
+import threading
 from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
-from typing import Optional, List, Mapping
+from typing import Optional, List, Mapping, Iterator, Tuple
 
-from cached_property import cached_property
-from construct import Array, Int32ul, Container
+from construct import Int32ul, Container
 
 from rpcclient.common import path_to_str
 from rpcclient.darwin.consts import TASK_DYLD_INFO, x86_THREAD_STATE64, ARMThreadFlavors, VM_FLAGS_ANYWHERE
@@ -17,21 +17,47 @@ from rpcclient.darwin.structs import pid_t, MAXPATHLEN, PROC_PIDLISTFDS, proc_fd
     vnode_fdinfowithpath, PROC_PIDFDVNODEPATHINFO, proc_taskallinfo, PROC_PIDTASKALLINFO, PROX_FDTYPE_SOCKET, \
     PROC_PIDFDSOCKETINFO, socket_fdinfo, so_kind_t, so_family_t, PROX_FDTYPE_PIPE, PROC_PIDFDPIPEINFO, pipe_info, \
     task_dyld_info_data_t, TASK_DYLD_INFO_COUNT, all_image_infos_t, dyld_image_info_t, x86_thread_state64_t, \
-    arm_thread_state64_t, PROX_FDTYPE_KQUEUE, ARM_THREAD_STATE64_COUNT, procargs2_t
+    arm_thread_state64_t, PROX_FDTYPE_KQUEUE, ARM_THREAD_STATE64_COUNT, procargs2_t, x86_THREAD_STATE64_COUNT
 from rpcclient.darwin.symbol import DarwinSymbol
 from rpcclient.exceptions import BadReturnValueError, ArgumentError, SymbolAbsentError, MissingLibraryError, \
     RpcClientException, ProcessSymbolAbsentError
 from rpcclient.processes import Processes
 from rpcclient.protocol import arch_t
-from rpcclient.structs.consts import SIGTERM, RTLD_NOW
+from rpcclient.structs.consts import SIGTERM, RTLD_NOW, EPERM
 from rpcclient.symbol import Symbol, ADDRESS_SIZE_TO_STRUCT_FORMAT
 from rpcclient.sysctl import CTL, KERN
 
+try:
+    from functools import cached_property
+except ImportError:
+    # python < 3.8
+    from cached_property import cached_property
+
 _CF_STRING_ARRAY_PREFIX_LEN = len('    "')
 _CF_STRING_ARRAY_SUFFIX_LEN = len('",')
 _BACKTRACE_FRAME_REGEX = re.compile(r'\[\s*(\d+)\] (0x[0-9a-f]+)\s+\{(.+?) \+ (.+?)\} (.*)')
 
 FdStruct = namedtuple('FdStruct', 'fd struct')
+FD_INFO_BUF_SIZE = 8196  # should be enough for all structs
+
+# vnode_fdinfowithpath and socket_fdinfo can't be compiled by construct, so they're parsed interpreted
+COMPILED_PROC_FDINFO = proc_fdinfo.compile()
+COMPILED_PIPE_INFO = pipe_info.compile()
+COMPILED_DYLD_IMAGE_INFO = dyld_image_info_t.compile()
+COMPILED_ALL_IMAGE_INFOS = all_image_infos_t.compile()
+COMPILED_TASK_DYLD_INFO = task_dyld_info_data_t.compile()
+COMPILED_X86_THREAD_STATE64 = x86_thread_state64_t.compile()
+COMPILED_ARM_THREAD_STATE64 = arm_thread_state64_t.compile()
+
+# construct computes sizeof() by walking the struct, so the sizes used per call are computed once
+X86_THREAD_STATE64_SIZE = x86_thread_state64_t.sizeof()
+ARM_THREAD_STATE64_SIZE = arm_thread_state64_t.sizeof()
+TASK_DYLD_INFO_SIZE = task_dyld_info_data_t.sizeof()
+DYLD_IMAGE_INFO_SIZE = dyld_image_info_t.sizeof()
+PROC_FDINFO_SIZE = proc_fdinfo.sizeof()
+VNODE_FDINFOWITHPATH_SIZE = vnode_fdinfowithpath.sizeof()
+PIPE_INFO_SIZE = pipe_info.sizeof()
+PROC_TASKALLINFO_SIZE = proc_taskallinfo.sizeof()
 
 
 @dataclasses.dataclass()
@@ -103,14 +129,56 @@ class Ipv6UdpFd(Ipv6SocketFd):
 Image = namedtuple('Image', 'address path')
 
 SOCKET_TYPE_DATACLASS = {
-    so_family_t.AF_INET: {
-        so_kind_t.SOCKINFO_TCP: Ipv4TcpFd,
-        so_kind_t.SOCKINFO_IN: Ipv4UdpFd,
-    },
-    so_family_t.AF_INET6: {
-        so_kind_t.SOCKINFO_TCP: Ipv6TcpFd,
-        so_kind_t.SOCKINFO_IN: Ipv6UdpFd,
-    }
+    (so_family_t.AF_INET, so_kind_t.SOCKINFO_TCP): Ipv4TcpFd,
+    (so_family_t.AF_INET, so_kind_t.SOCKINFO_IN): Ipv4UdpFd,
+    (so_family_t.AF_INET6, so_kind_t.SOCKINFO_TCP): Ipv6TcpFd,
+    (so_family_t.AF_INET6, so_kind_t.SOCKINFO_IN): Ipv6UdpFd,
+}
+
+
+def _in_sockinfo(psi: Container) -> Container:
+    """ get the in_sockinfo of an inet/inet6 socket_info """
+    if psi.soi_kind == so_kind_t.SOCKINFO_TCP:
+        return psi.soi_proto.pri_tcp.tcpsi_ini
+    return psi.soi_proto.pri_in
+
+
+def _make_file_fd(fd: Container, parsed: Container) -> Fd:
+    return FileFd(fd=fd.proc_fd, path=parsed.pvip.vip_path)
+
+
+def _make_kqueue_fd(fd: Container, parsed: None) -> Fd:
+    return KQueueFd(fd=fd.proc_fd)
+
+
+def _make_pipe_fd(fd: Container, parsed: Container) -> Fd:
+    return PipeFd(fd=fd.proc_fd)
+
+
+def _make_socket_fd(fd: Container, parsed: Container) -> Optional[Fd]:
+    psi = parsed.psi
+    correct_class = SOCKET_TYPE_DATACLASS.get((psi.soi_family, psi.soi_kind))
+
+    if correct_class is not None:
+        info = _in_sockinfo(psi)
+        return correct_class(fd=fd.proc_fd,
+                             local_address=info.insi_laddr.ina_46.i46a_addr4,
+                             local_port=info.insi_lport,
+                             remote_address=info.insi_faddr.ina_46.i46a_addr4,
+                             remote_port=info.insi_fport)
+
+    if psi.soi_kind == so_kind_t.SOCKINFO_UN:
+        return UnixFd(fd=fd.proc_fd, path=psi.soi_proto.pri_un.unsi_addr.ua_sun.sun_path)
+
+    return None
+
+
+# fd type to a function building its Fd object from an FdStruct's fields (or None if it isn't supported)
+FD_TYPE_MAKER = {
+    PROX_FDTYPE_VNODE: _make_file_fd,
+    PROX_FDTYPE_KQUEUE: _make_kqueue_fd,
+    PROX_FDTYPE_PIPE: _make_pipe_fd,
+    PROX_FDTYPE_SOCKET: _make_socket_fd,
 }
 
 
@@ -141,30 +209,32 @@ class Thread:
 
 class IntelThread64(Thread):
     def get_state(self):
-        with self._client.safe_malloc(x86_thread_state64_t.sizeof()) as p_state:
-            with self._client.safe_malloc(x86_thread_state64_t.sizeof()) as p_thread_state_count:
-                p_thread_state_count[0] = x86_thread_state64_t.sizeof() // Int32ul.sizeof()
+        with self._client.safe_malloc(X86_THREAD_STATE64_SIZE) as p_state:
+            with self._client.safe_malloc(Int32ul.sizeof()) as p_thread_state_count:
+                p_thread_state_count.item_size = Int32ul.sizeof()
+                p_thread_state_count[0] = x86_THREAD_STATE64_COUNT
                 if self._client.symbols.thread_get_state(self._thread_id, x86_THREAD_STATE64,
                                                          p_state, p_thread_state_count):
                     raise BadReturnValueError('thread_get_state() failed')
-                return x86_thread_state64_t.parse_stream(p_state)
+                return COMPILED_X86_THREAD_STATE64.parse(p_state.peek(X86_THREAD_STATE64_SIZE))
 
     def set_state(self, state: Mapping):
         if self._client.symbols.thread_set_state(self._thread_id, x86_THREAD_STATE64,
                                                  x86_thread_state64_t.build(state),
-                                                 x86_thread_state64_t.sizeof() // Int32ul.sizeof()):
+                                                 x86_THREAD_STATE64_COUNT):
             raise BadReturnValueError('thread_set_state() failed')
 
 
 class ArmThread64(Thread):
     def get_state(self):
-        with self._client.safe_malloc(arm_thread_state64_t.sizeof()) as p_state:
-            with self._client.safe_malloc(arm_thread_state64_t.sizeof()) as p_thread_state_count:
+        with self._client.safe_malloc(ARM_THREAD_STATE64_SIZE) as p_state:
+            with self._client.safe_malloc(Int32ul.sizeof()) as p_thread_state_count:
+                p_thread_state_count.item_size = Int32ul.sizeof()
                 p_thread_state_count[0] = ARM_THREAD_STATE64_COUNT
                 if self._client.symbols.thread_get_state(self._thread_id, ARMThreadFlavors.ARM_THREAD_STATE64,
                                                          p_state, p_thread_state_count):
                     raise BadReturnValueError('thread_get_state() failed')
-                return arm_thread_state64_t.parse_stream(p_state)
+                return COMPILED_ARM_THREAD_STATE64.parse(p_state.peek(ARM_THREAD_STATE64_SIZE))
 
     def set_state(self, state: Mapping):
         if self._client.symbols.thread_set_state(self._thread_id, ARMThreadFlavors.ARM_THREAD_STATE64,
@@ -295,6 +365,10 @@ class ProcessSymbol(Symbol):
 
 class Process:
     PEEK_STR_CHUNK_SIZE = 0x100
+    # strings within this span are read using a single peek
+    PEEK_STRS_MAX_SPAN = 0x10000
+    # spans read using a single peek_many() request
+    PEEK_STRS_BATCH_SIZE = 0x100000
 
     def __init__(self, client, pid: int):
         self._client = client
@@ -324,6 +398,16 @@ class Process:
 
     def peek_str(self, address: int, encoding='utf-8') -> str:
         """ peek string at memory address """
+        # most strings are paths or names, so try a single peek first
+        try:
+            buf = self.peek(address, MAXPATHLEN)
+        except BadReturnValueError:
+            # the range may cross unmapped memory
+            buf = b''
+        end = buf.find(b'\x00')
+        if end != -1:
+            return buf[:end].decode(encoding)
+
         size = self.PEEK_STR_CHUNK_SIZE
         buf = b''
 
@@ -336,6 +420,64 @@ class Process:
             except BadReturnValueError:
                 size = size // 2
 
+    def peek_many(self, regions: List[Tuple[int, int]]) -> List[Optional[bytes]]:
+        """ peek at many (address, size) regions, returning None for the unreadable ones """
+        offsets = []
+        total = 0
+        for _, size in regions:
+            offsets.append(total)
+            total += size
+
+        # every region is copied into its own slice of a single buffer, so all of them are read back at once
+        with self._client.safe_malloc(max(total, 1)) as buf:
+            with self._client.safe_malloc(8) as p_size:
+                readable = []
+                for (address, size), offset in zip(regions, offsets):
+                    p_size[0] = size
+                    readable.append(not self._client.symbols.vm_read_overwrite(self.task, address, size, buf + offset,
+                                                                               p_size))
+                data = iter(self._client.peek_many(
+                    [(buf + offset, size) for (_, size), offset, ok in zip(regions, offsets, readable) if ok]))
+                return [next(data) if ok else None for ok in readable]
+
+    def peek_strs(self, addresses: List[int], encoding='utf-8') -> Mapping[int, str]:
+        """ peek strings at many memory addresses, reading nearby ones using a single peek """
+        result = {}
+        addresses = sorted(set(addresses))
+        spans = []  # (addresses, size) of each cluster of nearby strings
+        i = 0
+        while i < len(addresses):
+            start = addresses[i]
+            j = i + 1
+            while j < len(addresses) and addresses[j] + MAXPATHLEN - start <= self.PEEK_STRS_MAX_SPAN:
+                j += 1
+            spans.append((addresses[i:j], addresses[j - 1] + MAXPATHLEN - start))
+            i = j
+
+        i = 0
+        while i < len(spans):
+            j = i + 1
+            total = spans[i][1]
+            while j < len(spans) and total + spans[j][1] <= self.PEEK_STRS_BATCH_SIZE:
+                total += spans[j][1]
+                j += 1
+            batch = spans[i:j]
+            i = j
+
+            bufs = self.peek_many([(cluster[0], size) for cluster, size in batch])
+            for (cluster, _), buf in zip(batch, bufs):
+                # the range may cross unmapped memory
+                buf = buf or b''
+                for address in cluster:
+                    offset = address - cluster[0]
+                    end = buf.find(b'\x00', offset)
+                    if end == -1:
+                        # either the peek failed or the string is longer than expected
+                        result[address] = self.peek_str(address, encoding)
+                    else:
+                        result[address] = buf[offset:end].decode(encoding)
+        return result
+
     def poke(self, address: int, buf: bytes):
         """ poke at memory address """
         if self._client.symbols.vm_write(self.task, address, buf, len(buf)):
@@ -382,19 +524,21 @@ class Process:
         """ get loaded image list """
         result = []
 
-        with self._client.safe_malloc(task_dyld_info_data_t.sizeof()) as dyld_info:
+        with self._client.safe_malloc(TASK_DYLD_INFO_SIZE) as dyld_info:
             with self._client.safe_calloc(8) as count:
                 count[0] = TASK_DYLD_INFO_COUNT
                 if self._client.symbols.task_info(self.task, TASK_DYLD_INFO, dyld_info, count):
                     raise BadReturnValueError('task_info(TASK_DYLD_INFO) failed')
-                dyld_info_data = task_dyld_info_data_t.parse_stream(dyld_info)
-        all_image_infos = all_image_infos_t.parse(
+                dyld_info_data = COMPILED_TASK_DYLD_INFO.parse(dyld_info.peek(TASK_DYLD_INFO_SIZE))
+        all_image_infos = COMPILED_ALL_IMAGE_INFOS.parse(
             self.peek(dyld_info_data.all_image_info_addr, dyld_info_data.all_image_info_size))
 
-        buf = self.peek(all_image_infos.infoArray, all_image_infos.infoArrayCount * dyld_image_info_t.sizeof())
-        for image in Array(all_image_infos.infoArrayCount, dyld_image_info_t).parse(buf):
-            path = self.peek_str(image.imageFilePath)
-            result.append(Image(address=image.imageLoadAddress, path=path))
+        buf = self.peek(all_image_infos.infoArray, all_image_infos.infoArrayCount * DYLD_IMAGE_INFO_SIZE)
+        infos = [COMPILED_DYLD_IMAGE_INFO.parse(buf[offset:offset + DYLD_IMAGE_INFO_SIZE])
+                 for offset in range(0, len(buf), DYLD_IMAGE_INFO_SIZE)]
+        paths = self.peek_strs([image.imageFilePath for image in infos])
+        for image in infos:
+            result.append(Image(address=image.imageLoadAddress, path=paths[image.imageFilePath]))
         return result
 
     @property
@@ -406,7 +550,9 @@ class Process:
                 if self._client.symbols.task_threads(self.task, threads, count):
                     raise BadReturnValueError('task_threads() failed')
 
-                for tid in Array(count[0].c_uint32, Int32ul).parse(threads[0].peek(count[0] * 4)):
+                thread_count = count[0].c_uint32
+                for tid in struct.unpack(f'{self._client._endianness}{thread_count}I',
+                                         threads[0].peek(thread_count * Int32ul.sizeof())):
                     result.append(self._thread_class(self._client, tid))
         return result
 
@@ -415,113 +561,104 @@ class Process:
         """ get pid """
         return self._pid
 
-    @property
+    @cached_property
     def fds(self) -> List[Fd]:
-        """ get a list of process opened file descriptors """
-        result = []
-        for fdstruct in self.fd_structs:
-            fd = fdstruct.fd
-            parsed = fdstruct.struct
-
-            if fd.proc_fdtype == PROX_FDTYPE_VNODE:
-                result.append(FileFd(fd=fd.proc_fd, path=parsed.pvip.vip_path))
-
-            elif fd.proc_fdtype == PROX_FDTYPE_KQUEUE:
-                result.append(KQueueFd(fd=fd.proc_fd))
-
-            elif fd.proc_fdtype == PROX_FDTYPE_PIPE:
-                result.append(PipeFd(fd=fd.proc_fd))
-
-            elif fd.proc_fdtype == PROX_FDTYPE_SOCKET:
-                if parsed.psi.soi_kind in (so_kind_t.SOCKINFO_TCP, so_kind_t.SOCKINFO_IN):
-                    correct_class = SOCKET_TYPE_DATACLASS[parsed.psi.soi_family][parsed.psi.soi_kind]
-
-                    if parsed.psi.soi_kind == so_kind_t.SOCKINFO_TCP:
-                        info = parsed.psi.soi_proto.pri_tcp.tcpsi_ini
-                    else:
-                        info = parsed.psi.soi_proto.pri_in
-                    result.append(correct_class(fd=fd.proc_fd,
-                                                local_address=info.insi_laddr.ina_46.i46a_addr4,
-                                                local_port=info.insi_lport,
-                                                remote_address=info.insi_faddr.ina_46.i46a_addr4,
-                                                remote_port=info.insi_fport))
-
-                elif parsed.psi.soi_kind == so_kind_t.SOCKINFO_UN:
-                    result.append(UnixFd(fd=fd.proc_fd, path=parsed.psi.soi_proto.pri_un.unsi_addr.ua_sun.sun_path))
-
-        return result
+        """ get a list of process opened file descriptors (cached, see invalidate_fds()) """
+        # fd_structs only holds fd types that have a maker
+        fds = (FD_TYPE_MAKER[fd.proc_fdtype](fd, parsed) for fd, parsed in self.fd_structs)
+        return [fd for fd in fds if fd is not None]
+
+    def listening_ports(self) -> Iterator[int]:
+        """ iterate the local ports of the process inet/inet6 sockets with no remote peer """
+        for fd, parsed in self.fd_structs:
+            if fd.proc_fdtype != PROX_FDTYPE_SOCKET:
+                continue
+            psi = parsed.psi
+            if (psi.soi_family, psi.soi_kind) not in SOCKET_TYPE_DATACLASS:
+                continue
+            info = _in_sockinfo(psi)
+            if info.insi_fport == 0:
+                yield info.insi_lport
 
-    @property
+    @cached_property
     def fd_structs(self) -> List[FdStruct]:
-        """ get a list of process opened file descriptors as raw structs """
+        """ get a list of process opened file descriptors as raw structs (cached, see invalidate_fds()) """
         result = []
-        size = self._client.symbols.proc_pidinfo(self.pid, PROC_PIDLISTFDS, 0, 0, 0)
-
-        vi_size = 8196  # should be enough for all structs
-        with self._client.safe_malloc(vi_size) as vi_buf:
-            with self._client.safe_malloc(size) as fdinfo_buf:
-                size = int(self._client.symbols.proc_pidinfo(self.pid, PROC_PIDLISTFDS, 0, fdinfo_buf, size))
-                if not size:
-                    raise BadReturnValueError('proc_pidinfo(PROC_PIDLISTFDS) failed')
-
-                for fd in Array(size // proc_fdinfo.sizeof(), proc_fdinfo).parse(fdinfo_buf.peek(size)):
-
-                    if fd.proc_fdtype == PROX_FDTYPE_VNODE:
-                        # file
-                        vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDVNODEPATHINFO, vi_buf,
-                                                                 vi_size)
-                        if not vs:
-                            if self._client.errno == errno.EBADF:
-                                # lsof treats this as fine
-                                continue
-                            raise BadReturnValueError(
-                                f'proc_pidinfo(PROC_PIDFDVNODEPATHINFO) failed for fd: {fd.proc_fd} '
-                                f'({self._client.last_error})')
-
-                        result.append(
-                            FdStruct(fd=fd,
-                                     struct=vnode_fdinfowithpath.parse(vi_buf.peek(vnode_fdinfowithpath.sizeof()))))
-
-                    elif fd.proc_fdtype == PROX_FDTYPE_KQUEUE:
-                        result.append(FdStruct(fd=fd, struct=None))
-
-                    elif fd.proc_fdtype == PROX_FDTYPE_SOCKET:
-                        # socket
-                        vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDSOCKETINFO, vi_buf,
-                                                                 vi_size)
-                        if not vs:
-                            if self._client.errno == errno.EBADF:
-                                # lsof treats this as fine
-                                continue
-                            raise BadReturnValueError(
-                                f'proc_pidinfo(PROC_PIDFDSOCKETINFO) failed ({self._client.last_error})')
-
-                        result.append(FdStruct(fd=fd, struct=socket_fdinfo.parse(vi_buf.peek(vi_size))))
-
-                    elif fd.proc_fdtype == PROX_FDTYPE_PIPE:
-                        # pipe
-                        vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDPIPEINFO, vi_buf,
-                                                                 vi_size)
-                        if not vs:
-                            if self._client.errno == errno.EBADF:
-                                # lsof treats this as fine
-                                continue
-                            raise BadReturnValueError(
-                                f'proc_pidinfo(PROC_PIDFDPIPEINFO) failed ({self._client.last_error})')
-
-                        result.append(
-                            FdStruct(fd=fd,
-                                     struct=pipe_info.parse(vi_buf.peek(pipe_info.sizeof()))))
+        size = int(self._client.symbols.proc_pidinfo(self.pid, PROC_PIDLISTFDS, 0, 0, 0))
+
+        vi_size = FD_INFO_BUF_SIZE
+        with self._client.processes.fd_buffers(size) as (vi_buf, fdinfo_buf):
+            size = int(self._client.symbols.proc_pidinfo(self.pid, PROC_PIDLISTFDS, 0, fdinfo_buf, size))
+            if not size:
+                raise BadReturnValueError('proc_pidinfo(PROC_PIDLISTFDS) failed')
+
+            fdinfo_list = fdinfo_buf.peek(size)
+            for offset in range(0, size - size % PROC_FDINFO_SIZE, PROC_FDINFO_SIZE):
+                fd = COMPILED_PROC_FDINFO.parse(fdinfo_list[offset:offset + PROC_FDINFO_SIZE])
+
+                if fd.proc_fdtype == PROX_FDTYPE_VNODE:
+                    # file
+                    vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDVNODEPATHINFO, vi_buf,
+                                                             vi_size)
+                    if not vs:
+                        if self._client.errno == errno.EBADF:
+                            # lsof treats this as fine
+                            continue
+                        raise BadReturnValueError(
+                            f'proc_pidinfo(PROC_PIDFDVNODEPATHINFO) failed for fd: {fd.proc_fd} '
+                            f'({self._client.last_error})')
+
+                    result.append(FdStruct(fd, vnode_fdinfowithpath.parse(vi_buf.peek(VNODE_FDINFOWITHPATH_SIZE))))
+
+                elif fd.proc_fdtype == PROX_FDTYPE_KQUEUE:
+                    result.append(FdStruct(fd, None))
+
+                elif fd.proc_fdtype == PROX_FDTYPE_SOCKET:
+                    # socket
+                    vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDSOCKETINFO, vi_buf,
+                                                             vi_size)
+                    if not vs:
+                        if self._client.errno == errno.EBADF:
+                            # lsof treats this as fine
+                            continue
+                        raise BadReturnValueError(
+                            f'proc_pidinfo(PROC_PIDFDSOCKETINFO) failed ({self._client.last_error})')
+
+                    # socket_fdinfo has no static size (soi_proto depends on soi_kind), so only read what was written
+                    result.append(FdStruct(fd, socket_fdinfo.parse(vi_buf.peek(int(vs)))))
+
+                elif fd.proc_fdtype == PROX_FDTYPE_PIPE:
+                    # pipe
+                    vs = self._client.symbols.proc_pidfdinfo(self.pid, fd.proc_fd, PROC_PIDFDPIPEINFO, vi_buf,
+                                                             vi_size)
+                    if not vs:
+                        if self._client.errno == errno.EBADF:
+                            # lsof treats this as fine
+                            continue
+                        raise BadReturnValueError(
+                            f'proc_pidinfo(PROC_PIDFDPIPEINFO) failed ({self._client.last_error})')
+
+                    result.append(FdStruct(fd, COMPILED_PIPE_INFO.parse(vi_buf.peek(PIPE_INFO_SIZE))))
 
             return result
 
+    def invalidate_fds(self) -> None:
+        """ drop the cached fds and fd_structs so the next access queries them again """
+        self.__dict__.pop('fds', None)
+        self.__dict__.pop('fd_structs', None)
+
     @property
     def task_all_info(self):
         """ get a list of process opened file descriptors """
-        with self._client.safe_malloc(proc_taskallinfo.sizeof()) as pti:
-            if not self._client.symbols.proc_pidinfo(self.pid, PROC_PIDTASKALLINFO, 0, pti, proc_taskallinfo.sizeof()):
+        with self._client.safe_malloc(PROC_TASKALLINFO_SIZE) as pti:
+            if not self._client.symbols.proc_pidinfo(self.pid, PROC_PIDTASKALLINFO, 0, pti, PROC_TASKALLINFO_SIZE):
                 raise BadReturnValueError('proc_pidinfo(PROC_PIDTASKALLINFO) failed')
-            return proc_taskallinfo.parse_stream(pti)
+            return proc_taskallinfo.parse(pti.peek(PROC_TASKALLINFO_SIZE))
+
+    @cached_property
+    def _task_all_info(self):
+        """ task_all_info snapshot shared by the cached process attributes """
+        return self.task_all_info
 
     @property
     def backtraces(self) -> List[Backtrace]:
@@ -566,31 +703,31 @@ class Process:
         path = self.path
         if not path:
             return None
-        return Path(path).parts[-1]
+        return path.rpartition('/')[2]
 
     @cached_property
     def name(self) -> str:
-        return self.task_all_info.pbsd.pbi_name
+        return self._task_all_info.pbsd.pbi_name
 
     @cached_property
     def ppid(self) -> int:
-        return self.task_all_info.pbsd.pbi_ppid
+        return self._task_all_info.pbsd.pbi_ppid
 
     @cached_property
     def uid(self) -> int:
-        return self.task_all_info.pbsd.pbi_uid
+        return self._task_all_info.pbsd.pbi_uid
 
     @cached_property
     def gid(self) -> int:
-        return self.task_all_info.pbsd.pbi_gid
+        return self._task_all_info.pbsd.pbi_gid
 
     @cached_property
     def ruid(self) -> int:
-        return self.task_all_info.pbsd.pbi_ruid
+        return self._task_all_info.pbsd.pbi_ruid
 
     @cached_property
     def rgid(self) -> int:
-        return self.task_all_info.pbsd.pbi_rgid
+        return self._task_all_info.pbsd.pbi_rgid
 
     @cached_property
     def start_time(self) -> datetime:
@@ -681,6 +818,37 @@ class DarwinProcesses(Processes):
         super().__init__(client)
         self._load_symbolication_library()
 
+        # remote scratch buffers reused by every Process.fd_structs query
+        self._fd_buffers_lock = threading.Lock()
+        self._vi_buf = None
+        self._fdinfo_buf = None
+        self._fdinfo_buf_size = 0
+
+    @contextmanager
+    def fd_buffers(self, fdinfo_size: int):
+        """ lock and yield the (vi_buf, fdinfo_buf) scratch buffers, growing fdinfo_buf to fit fdinfo_size """
+        with self._fd_buffers_lock:
+            if self._vi_buf is None:
+                self._vi_buf = self._client.symbols.malloc(FD_INFO_BUF_SIZE)
+                if not self._vi_buf:
+                    self._vi_buf = None
+                    raise BadReturnValueError('malloc() failed')
+
+            if self._fdinfo_buf is None or fdinfo_size > self._fdinfo_buf_size:
+                # grow geometrically so processes with slightly more fds don't cause a reallocation each
+                new_size = max(fdinfo_size, self._fdinfo_buf_size * 2)
+                if self._fdinfo_buf is not None:
+                    self._client.symbols.free(self._fdinfo_buf)
+                    self._fdinfo_buf = None
+                    self._fdinfo_buf_size = 0
+                fdinfo_buf = self._client.symbols.malloc(new_size)
+                if not fdinfo_buf:
+                    raise BadReturnValueError('malloc() failed')
+                self._fdinfo_buf = fdinfo_buf
+                self._fdinfo_buf_size = new_size
+
+            yield self._vi_buf, self._fdinfo_buf
+
     def _load_symbolication_library(self):
         options = [
             '/System/Library/PrivateFrameworks/Symbolication.framework/Symbolication'
@@ -692,24 +860,24 @@ class DarwinProcesses(Processes):
 
     def get_by_pid(self, pid: int) -> Process:
         """ get process object by pid """
-        proc_list = self.list()
-        for p in proc_list:
-            if p.pid == pid:
-                return p
-        raise ArgumentError(f'failed to locate process with pid: {pid}')
+        if pid < 0:
+            # kill() treats negative pids as process groups (or as every process for -1)
+            raise ArgumentError(f'invalid pid: {pid}')
+        # signal 0 only checks for the process existence. EPERM means it exists but isn't ours to signal
+        if 0 != self._client.symbols.kill(pid, 0) and self._client.errno != EPERM:
+            raise ArgumentError(f'failed to locate process with pid: {pid}')
+        return Process(self._client, pid)
 
     def get_by_basename(self, name: str) -> Process:
         """ get process object by basename """
-        proc_list = self.list()
-        for p in proc_list:
+        for p in self.iter_processes():
             if p.basename == name:
                 return p
         raise ArgumentError(f'failed to locate process with name: {name}')
 
     def get_by_name(self, name: str) -> Process:
         """ get process object by name """
-        proc_list = self.list()
-        for p in proc_list:
+        for p in self.iter_processes():
             if p.name == name:
                 return p
         raise ArgumentError(f'failed to locate process with name: {name}')
@@ -717,38 +885,27 @@ class DarwinProcesses(Processes):
     def grep(self, name: str) -> List[Process]:
         """ get process list by basename filter """
         result = []
-        proc_list = self.list()
-        for p in proc_list:
-            if p.basename and name in p.basename:
+        for p in self.iter_processes():
+            basename = p.basename
+            if basename and name in basename:
                 result.append(p)
         return result
 
     def get_process_by_listening_port(self, port: int) -> Optional[Process]:
         """ get a process object listening on the specified port """
-        for process in self.list():
+        for process in self.iter_processes():
             try:
-                fds = process.fds
+                if port in process.listening_ports():
+                    return process
             except BadReturnValueError:
                 # it's possible to get error if new processes have since died or the rpcserver
                 # doesn't have the required permissions to access all the processes
                 continue
 
-            for fd in fds:
-                if (isinstance(fd, Ipv4SocketFd) or isinstance(fd, Ipv6SocketFd)) and \
-                        fd.local_port == port and fd.remote_port == 0:
-                    return process
-
     def lsof(self) -> Mapping[int, List[Fd]]:
         """ get dictionary of pid to its opened fds """
         result = {}
-        for process in self.list():
-            try:
-                fds = process.fds
-            except BadReturnValueError:
-                # it's possible to get error if new processes have since died or the rpcserver
-                # doesn't have the required permissions to access all the processes
-                continue
-
+        for process, fds in self._iter_fds():
             result[process.pid] = fds
         return result
 
@@ -756,32 +913,48 @@ class DarwinProcesses(Processes):
     def fuser(self, path: str) -> List[Process]:
         """get a list of all processes have an open hande to the specified path """
         result = []
-        proc_list = self.list()
-        for process in proc_list:
+
+        # the path is relative to the remote cwd and may contain symlinks, so it must be resolved at remote
+        target = self._client.symbols.realpath(path, 0)
+        if target:
+            with self._client.freeing(target):
+                target = target.peek_str()
+        else:
+            # the path may no longer exist while still being held open
+            target = posixpath.normpath(posixpath.join(self._client.fs.pwd(), path))
+
+        for process, fds in self._iter_fds():
+            for fd in fds:
+                # paths reported by the kernel are already resolved
+                if isinstance(fd, FileFd) and fd.path and posixpath.normpath(fd.path) == target:
+                    result.append(process)
+
+        return result
+
+    def _iter_fds(self):
+        """ iterate (process, fds) for all currently running processes whose fds are accessible """
+        for process in self.iter_processes():
             try:
                 fds = process.fds
             except BadReturnValueError:
                 # it's possible to get error if new processes have since died or the rpcserver
                 # doesn't have the required permissions to access all the processes
                 continue
+            yield process, fds
 
-            for fd in fds:
-                if isinstance(fd, FileFd):
-                    if str(Path(fd.path).absolute()) == str(Path(path).absolute()):
-                        result.append(process)
-
-        return result
+    def iter_processes(self) -> Iterator[Process]:
+        """ iterate all currently running processes, creating each Process only once reached """
+        for pid in self._list_pids():
+            yield Process(self._client, pid)
 
     def list(self) -> List[Process]:
         """ list all currently running processes """
+        return list(self.iter_processes())
+
+    def _list_pids(self) -> List[int]:
         n = self._client.symbols.proc_listallpids(0, 0)
         pid_buf_size = pid_t.sizeof() * n
         with self._client.safe_malloc(pid_buf_size) as pid_buf:
-            pid_buf.item_size = pid_t.sizeof()
-            n = self._client.symbols.proc_listallpids(pid_buf, pid_buf_size)
-
-            result = []
-            for i in range(n):
-                pid = int(pid_buf[i])
-                result.append(Process(self._client, pid))
-            return result
+            n = int(self._client.symbols.proc_listallpids(pid_buf, pid_buf_size))
+            # read the whole pid array at once instead of a remote read per pid
+            return list(struct.unpack(f'{self._client._endianness}{n}I', pid_buf.peek(n * pid_t.sizeof())))
@@ -1,3 +1,5 @@
+import socket
+
 from construct import PaddedString, Struct, Int32ul, Int16ul, Int64ul, Int8ul, this, Int32sl, Padding, Array, Int64sl, \
     Bytes, Computed, FlagsEnum, Int16sl, Union, Enum, Switch, Int16ub, Adapter, Default, Aligned, CString, GreedyRange
 
@@ -418,10 +420,10 @@ TSI_T_NTIMERS = 4
 
 class IpAddressAdapter(Adapter):
     def _decode(self, obj, context, path):
-        return ".".join(map(str, obj))
+        return socket.inet_ntoa(obj)
 
     def _encode(self, obj, context, path):
-        return list(map(int, obj.split(".")))
+        return socket.inet_aton(obj)
 
 
 in4in6_addr = Struct(
@@ -713,6 +715,7 @@ STRUCT_X86_THREAD_STATE64 = Struct(
 )
 
 x86_thread_state64_t = STRUCT_X86_THREAD_STATE64
+x86_THREAD_STATE64_COUNT = x86_thread_state64_t.sizeof() // uint32_t.sizeof()
 
 suseconds_t = uint32_t
 
@@ -6,12 +6,13 @@ from typing import List
 from rpcclient.allocated import Allocated
 from rpcclient.common import path_to_str
 from rpcclient.darwin.structs import MAXPATHLEN
-from rpcclient.darwin.symbol import DarwinSymbol
 from rpcclient.exceptions import BadReturnValueError, ArgumentError, RpcFileNotFoundError, RpcFileExistsError, \
     RpcIsADirectoryError, RpcClientException
 from rpcclient.structs.consts import O_RDONLY, O_WRONLY, O_CREAT, O_TRUNC, S_IFMT, S_IFDIR, O_RDWR, SEEK_CUR, S_IFREG, \
     DT_LNK, DT_UNKNOWN, S_IFLNK, DT_REG, DT_DIR, R_OK
 
+MODE_TO_D_TYPE = {S_IFLNK: DT_LNK, S_IFDIR: DT_DIR, S_IFREG: DT_REG}
+
 
 class DirEntry:
     def __init__(self, path, entry, client):
@@ -31,7 +32,7 @@ class DirEntry:
 
     def inode(self):
         """ Return inode of the entry; cached per entry. """
-        return self._entry.d_ino
+        return self._entry.d_inode
 
     def is_dir(self, *, follow_symlinks=True):
         """ Return True if the entry is a directory; cached per entry. """
@@ -63,8 +64,7 @@ class DirEntry:
         is_symlink = self._entry.d_type == DT_LNK
         need_stat = self._entry.d_type == DT_UNKNOWN or (follow_symlinks and is_symlink)
         if not need_stat:
-            d_types = {S_IFLNK: DT_LNK, S_IFDIR: DT_DIR, S_IFREG: DT_REG}
-            return self._entry.d_type == d_types[mode]
+            return self._entry.d_type == MODE_TO_D_TYPE[mode]
         else:
             st_mode = self.stat(follow_symlinks=follow_symlinks).st_mode
             if not st_mode:
@@ -83,7 +83,7 @@ class DirEntry:
 
         if result.errno != 0:
             self._client.errno = result.errno
-            self._client.raise_errno_exception(f'failed to stat: {self._entry.name}')
+            self._client.raise_errno_exception(f'failed to stat(): {self.path}')
         return result
 
     def __repr__(self):
@@ -92,6 +92,7 @@ class DirEntry:
 
 class File(Allocated):
     CHUNK_SIZE = 1024 * 64
+    PIPELINE_DEPTH = 16
 
     def __init__(self, client, fd: int):
         """
@@ -118,37 +119,99 @@ class File(Allocated):
     def tell(self) -> int:
         return self.seek(0, SEEK_CUR)
 
-    def _write(self, buf: bytes) -> int:
+    def _write(self, buf: int, size: int) -> int:
         """ write(fd, buf, size) at remote. read man for more details. """
-        n = self._client.symbols.write(self.fd, buf, len(buf)).c_int64
+        n = self._client.symbols.write(self.fd, buf, size).c_int64
         if n < 0:
             self._client.raise_errno_exception(f'failed to write on fd: {self.fd}')
         return n
 
-    def write(self, buf: bytes):
-        """ continue call write() until """
-        while buf:
-            err = self._write(buf)
-            buf = buf[err:]
+    def _chunk_size(self, chunk_size: int) -> int:
+        if chunk_size < 0:
+            raise ArgumentError(f'invalid chunk_size: {chunk_size}')
+        return chunk_size or self.CHUNK_SIZE
 
-    def _read(self, buf: DarwinSymbol, size: int) -> bytes:
-        """ read file at remote """
-        err = self._client.symbols.read(self.fd, buf, size).c_int64
-        if err < 0:
-            self._client.raise_errno_exception(f'read() failed for fd: {self.fd}')
-        return buf.peek(err)
+    def write(self, buf: bytes, chunk_size: int = CHUNK_SIZE):
+        """
+        continue call write() until all of buf is written, passing at most chunk_size bytes each time (0 for CHUNK_SIZE)
+
+        every chunk is poked into a single remote buffer and written from there, so partial writes are
+        retried without sending the data again.
+        """
+        chunk_size = self._chunk_size(chunk_size)
+        if isinstance(buf, str):
+            buf = buf.encode()
+        if not buf:
+            return
+
+        view = memoryview(buf)
+        offset = 0
+        with self._client.safe_malloc(min(len(view), chunk_size)) as chunk:
+            while offset < len(view):
+                size = min(chunk_size, len(view) - offset)
+                chunk.poke(bytes(view[offset:offset + size]))
+                written = 0
+                while written < size:
+                    written += self._write(chunk + written, size - written)
+                offset += size
 
     def read(self, size: int = -1, chunk_size: int = CHUNK_SIZE) -> bytes:
-        """ read file at remote """
-        buf = b''
-        with self._client.safe_malloc(chunk_size) as chunk:
-            while size == -1 or len(buf) < size:
-                read_chunk = self._read(chunk, chunk_size)
-                if not read_chunk:
-                    # EOF
-                    break
-                buf += read_chunk
-        return buf
+        """ read file at remote, reading chunk_size bytes at a time (0 for CHUNK_SIZE) """
+        chunk_size = self._chunk_size(chunk_size)
+        chunks = []
+        total = 0  # bytes read so far
+        depth = 1
+        eof = False
+        error = False
+        client = self._client
+        read = client.symbols.read
+
+        with client.safe_malloc(chunk_size) as chunk:
+            while not (eof or error) and (size == -1 or total < size):
+                counts = []
+                requested = 0
+                while len(counts) < depth and (size == -1 or total + requested < size):
+                    count = chunk_size if size == -1 else min(chunk_size, size - total - requested)
+                    counts.append(count)
+                    requested += count
+
+                if len(counts) == 1:
+                    err = read(self.fd, chunk, counts[0]).c_int64
+                    if err > 0:
+                        chunks.append(chunk.peek(err))
+                    results = [(counts[0], err)]
+                else:
+                    results = []
+                    stopped = False
+                    replies = client.call_and_peek(read, [([self.fd, chunk, count], chunk, count) for count in counts])
+                    for count, (ret, read_chunk) in zip(counts, replies):
+                        err = ret.c_int64
+                        # chunks of requests already in flight are dropped after EOF or an error
+                        if err <= 0:
+                            stopped = True
+                        elif not stopped:
+                            chunks.append(read_chunk[:err])
+                        results.append((count, err))
+
+                for count, err in results:
+                    if err < 0:
+                        error = True
+                        break
+                    if err == 0:
+                        eof = True
+                        break
+                    total += err
+
+                # the number of reads sent at once doubles while they come back full, so large files aren't bound
+                # by a round-trip per chunk, while small files and pipes don't pull unused chunks
+                if all(err == count for count, err in results):
+                    depth = min(depth * 2, self.PIPELINE_DEPTH)
+                else:
+                    depth = 1
+
+        if error:
+            client.raise_errno_exception(f'read() failed for fd: {self.fd}')
+        return b''.join(chunks)
 
     def pread(self, length: int, offset: int) -> bytes:
         """ call pread() at remote """
@@ -187,6 +250,10 @@ class File(Allocated):
 class Fs:
     """ filesystem utils """
 
+    # number of directory levels listed below the requested one by each request issued by walk().
+    # kept shallow since the whole listing is received before anything is yielded
+    WALK_PREFETCH_DEPTH = 1
+
     def __init__(self, client):
         self._client = client
 
@@ -335,20 +402,25 @@ class Fs:
         return File(self._client, fd)
 
     @path_to_str('file')
-    def write_file(self, file: str, buf: bytes, access: int = 0o777):
-        with self.open(file, 'w+', access=access) as f:
-            f.write(buf)
+    def write_file(self, file: str, buf: bytes, access: int = 0o777, chunk_size: int = File.CHUNK_SIZE):
+        """ write whole file at remote using a single request """
+        self._client.write_file(file, buf, access=access, chunk_size=chunk_size)
+
+    @path_to_str('file')
+    def read_file(self, file: str, chunk_size: int = File.CHUNK_SIZE) -> bytes:
+        """ read whole file at remote using a single request """
+        return self._client.read_file(file, chunk_size=chunk_size)
 
     @path_to_str('file')
-    def read_file(self, file: str) -> bytes:
-        with self.open(file, 'r') as f:
-            return f.read()
+    def read_file_into(self, file: str, dst, chunk_size: int = File.CHUNK_SIZE):
+        """ read whole file at remote using a single request into a bytearray or a writable file object """
+        self._client.read_file_into(file, dst, chunk_size=chunk_size)
 
     @path_to_str('remote')
     @path_to_str('local')
     def _pull_file(self, remote: str, local: str):
         with open(local, 'wb') as f:
-            f.write(self.read_file(remote))
+            self.read_file_into(remote, f)
 
     @path_to_str('remote')
     @path_to_str('local')
@@ -447,9 +519,8 @@ class Fs:
         chunk = self._client.symbols.getcwd(0, 0)
         if chunk == 0:
             self._client.raise_errno_exception('getcwd() failed')
-        buf = chunk.peek_str()
-        self._client.symbols.free(chunk)
-        return buf
+        with self._client.freeing(chunk):
+            return chunk.peek_str()
 
     @path_to_str('path')
     def listdir(self, path: str = '.') -> List[str]:
@@ -460,7 +531,9 @@ class Fs:
     def scandir(self, path: str = '.') -> List[DirEntry]:
         """ get directory listing for a given dirname """
         result = []
-        for entry in self._client.listdir(path)[2:]:
+        for entry in self._client.listdir(path):
+            if entry.d_name in ('.', '..'):
+                continue
             result.append(DirEntry(path, entry, self._client))
         return result
 
@@ -511,31 +584,59 @@ class Fs:
     @path_to_str('top')
     def walk(self, top: str, topdown=True, onerror=None):
         """ provides the same results as os.walk(top) """
-        dirs = []
-        files = []
-        try:
-            for entry in self.scandir(top):
-                try:
-                    if entry.is_dir():
-                        dirs.append(entry.name)
-                    else:
-                        files.append(entry.name)
-                except Exception as e:
-                    if not onerror:
-                        raise e
-                    onerror(e)
-        except Exception as e:
-            if not onerror:
-                raise e
-            onerror(e)
-
-        if topdown:
-            yield top, dirs, files
-
-        if dirs:
-            for d in dirs:
-                for walk_result in self.walk(posixpath.join(top, d), topdown=topdown, onerror=onerror):
-                    yield walk_result
+        # subtrees are listed ahead using a single request each, and consumed as the walk reaches them
+        prefetched = {}
+        # holds directories yet to be listed, and (top, dirs, files) results pending to be yielded bottom-up
+        stack = [top]
+        while stack:
+            top = stack.pop()
+            if isinstance(top, tuple):
+                yield top
+                continue
 
-        if not topdown:
-            yield top, dirs, files
+            dirs = []
+            files = []
+            try:
+                for entry in self._scandir_prefetched(top, prefetched):
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                        else:
+                            files.append(entry.name)
+                    except Exception as e:
+                        if not onerror:
+                            raise e
+                        onerror(e)
+            except Exception as e:
+                if not onerror:
+                    raise e
+                onerror(e)
+
+            if topdown:
+                listed_dirs = list(dirs)
+                yield top, dirs, files
+                # subtrees pruned by the caller won't be reached, so their prefetched listings are dropped
+                for d in set(listed_dirs).difference(dirs):
+                    self._drop_prefetched(prefetched, posixpath.join(top, d))
+            else:
+                stack.append((top, dirs, files))
+
+            # pushed in reverse so they are popped in listing order. also respects dirs modified by the caller
+            stack.extend(posixpath.join(top, d) for d in reversed(dirs))
+
+    @staticmethod
+    def _drop_prefetched(prefetched, path: str):
+        prefix = path.rstrip('/') + '/'
+        for key in [key for key in prefetched if key == path or key.startswith(prefix)]:
+            del prefetched[key]
+
+    def _scandir_prefetched(self, path: str, prefetched) -> List[DirEntry]:
+        if path not in prefetched:
+            prefetched.update(self._client.listdir_recursive(path, self.WALK_PREFETCH_DEPTH))
+        if path not in prefetched:
+            return self.scandir(path)
+        err, entries = prefetched.pop(path)
+        if err:
+            self._client.errno = err
+            self._client.raise_errno_exception(f'failed to listdir: {path}')
+        return [DirEntry(path, entry, self._client) for entry in entries]
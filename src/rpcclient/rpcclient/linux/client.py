@@ -6,6 +6,8 @@ from rpcclient.client import Client
 from rpcclient.linux.structs import utsname
 from rpcclient.protocol import arch_t
 
+COMPILED_UTSNAME = utsname.compile()
+
 
 class LinuxClient(Client):
     def __init__(self, sock, sysname: str, arch: arch_t, create_socket_cb: Callable):
@@ -15,4 +17,4 @@ class LinuxClient(Client):
     def uname(self):
         with self.safe_calloc(utsname.sizeof()) as uname:
             assert 0 == self.symbols.uname(uname)
-            return utsname.parse_stream(uname)
+            return COMPILED_UTSNAME.parse(uname.peek(utsname.sizeof()))
@@ -16,7 +16,15 @@ cmd_type_t = Enum(Int32ul,
                   CMD_REPLY_POKE=11,
                   CMD_LISTDIR=12,
                   CMD_SHOWOBJECT=13,
-                  CMD_SHOWCLASS=14
+                  CMD_SHOWCLASS=14,
+                  CMD_READ_FILE=15,
+                  CMD_REPLY_READ_FILE=16,
+                  CMD_WRITE_FILE=17,
+                  CMD_REPLY_WRITE_FILE=18,
+                  CMD_WALK=19,
+                  CMD_DYLD_LIST=20,
+                  CMD_OBJC_GET_CLASSES=21,
+                  CMD_PEEK_MANY=22,
                   )
 
 arch_t = Enum(Int32ul,
@@ -25,9 +33,10 @@ arch_t = Enum(Int32ul,
               )
 
 DEFAULT_PORT = 5910
-SERVER_MAGIC_VERSION = 0x88888806
+SERVER_MAGIC_VERSION = 0x8888880C
 MAGIC = 0x12345678
 MAX_PATH_LEN = 1024
+MAX_PEEK_MANY_REGIONS = 0x10000
 
 protocol_handshake_t = Struct(
     'magic' / Hex(Int32ul),
@@ -76,6 +85,10 @@ cmd_peek_t = Struct(
     'size' / Int64ul,
 )
 
+cmd_peek_many_t = Struct(
+    'regions' / PrefixedArray(Int64ul, cmd_peek_t),
+)
+
 cmd_poke_t = Struct(
     'address' / Int64ul,
     'size' / Int64ul,
@@ -94,6 +107,23 @@ cmd_showclass_t = Struct(
     'address' / Int64ul
 )
 
+cmd_objc_get_classes_t = Struct(
+    'names' / PrefixedArray(Int32ul, PascalString(Int32ul, 'utf8')),
+)
+
+cmd_read_file_t = Struct(
+    'filename' / PaddedString(MAX_PATH_LEN, 'utf8'),
+    'chunk_size' / Int64ul,
+)
+
+cmd_write_file_t = Struct(
+    'filename' / PaddedString(MAX_PATH_LEN, 'utf8'),
+    'access' / Int64ul,
+    'chunk_size' / Int64ul,
+    'size' / Int64ul,
+    'data' / Bytes(this.size),
+)
+
 listdir_entry_stat_t = Struct(
     'errno' / Int64ul,
     'st_dev' / Int64ul,  # device inode resides on
@@ -118,6 +148,16 @@ listdir_entry_t = Struct(
     'stat' / listdir_entry_stat_t,
 )
 
+cmd_walk_t = Struct(
+    'filename' / PaddedString(MAX_PATH_LEN, 'utf8'),
+    'depth' / Int64ul,
+)
+
+walk_dir_t = Struct(
+    'errno' / Int64ul,
+    'pathlen' / Int64ul,
+)
+
 protocol_message_t = Struct(
     'magic' / Const(MAGIC, Hex(Int32ul)),
     'cmd_type' / cmd_type_t,
@@ -132,6 +172,11 @@ protocol_message_t = Struct(
         cmd_type_t.CMD_LISTDIR: cmd_dirlist_t,
         cmd_type_t.CMD_SHOWOBJECT: cmd_showobject_t,
         cmd_type_t.CMD_SHOWCLASS: cmd_showclass_t,
+        cmd_type_t.CMD_READ_FILE: cmd_read_file_t,
+        cmd_type_t.CMD_WRITE_FILE: cmd_write_file_t,
+        cmd_type_t.CMD_WALK: cmd_walk_t,
+        cmd_type_t.CMD_OBJC_GET_CLASSES: cmd_objc_get_classes_t,
+        cmd_type_t.CMD_PEEK_MANY: cmd_peek_many_t,
     })
 )
 
@@ -1,6 +1,7 @@
 import pytest
 
 from rpcclient.exceptions import ArgumentError
+from rpcclient.protocol import MAX_PEEK_MANY_REGIONS
 
 
 def test_peek(client):
@@ -19,6 +20,60 @@ def test_peek_invalid_address(client):
         client.peek(0, 0x10)
 
 
+def test_peek_many(client):
+    """
+    :param rpcclient.client.Client client:
+    """
+    with client.safe_malloc(0x100) as peekable:
+        peekable.poke(bytes(range(0x100)))
+        assert client.peek_many([(peekable, 0x10), (peekable + 0x80, 0x80)]) == \
+               [bytes(range(0x10)), bytes(range(0x80, 0x100))]
+
+
+def test_peek_many_invalid_address(client):
+    """
+    :param rpcclient.client.Client client:
+    """
+    with client.safe_malloc(0x100) as peekable:
+        with pytest.raises(ArgumentError):
+            client.peek_many([(peekable, 0x10), (0, 0x10)])
+        # the connection should remain usable after a failed region
+        client.peek(peekable, 0x10)
+
+
+def test_peek_many_batches(client):
+    """
+    :param rpcclient.client.Client client:
+    """
+    with client.safe_malloc(0x100) as peekable:
+        peekable.poke(bytes(range(0x100)))
+        regions = [(peekable + i % 0x100, 1) for i in range(MAX_PEEK_MANY_REGIONS + 1)]
+        assert client.peek_many(regions) == [bytes([i % 0x100]) for i in range(MAX_PEEK_MANY_REGIONS + 1)]
+
+
+def test_call_and_peek(client):
+    """
+    :param rpcclient.client.Client client:
+    """
+    with client.safe_calloc(0x10) as peekable:
+        replies = client.call_and_peek(client.symbols.memset, [([peekable, 0x41, 4], peekable, 8),
+                                                               ([peekable + 4, 0x42, 4], peekable, 8)])
+        assert [data for _, data in replies] == [b'AAAA\x00\x00\x00\x00', b'AAAABBBB']
+        assert [ret for ret, _ in replies] == [peekable, peekable + 4]
+
+
+def test_call_and_peek_invalid_address(client):
+    """
+    :param rpcclient.client.Client client:
+    """
+    with client.safe_calloc(0x10) as peekable:
+        with pytest.raises(ArgumentError):
+            client.call_and_peek(client.symbols.memset, [([peekable, 0x41, 4], 0, 8),
+                                                         ([peekable, 0x42, 4], peekable, 8)])
+        # the connection should remain usable and the calls after the failed peek were still done
+        assert client.peek(peekable, 4) == b'BBBB'
+
+
 def test_calloc(client):
     """
     :param rpcclient.client.Client client:
@@ -16,3 +16,27 @@ def test_uname(client):
     """
     assert client.uname.sysname == 'Darwin'
     assert 'machine' in client.uname
+
+
+def test_objc_get_classes(client):
+    """
+    :param rpcclient.darwin.client.DarwinClient client:
+    """
+    classes = client.objc_get_classes(['NSObject', 'NSString', 'NoSuchClassName'])
+    assert sorted(classes) == ['NSObject', 'NSString']
+    assert client.objc_get_class('NSObject') is classes['NSObject']
+    assert client.objc_get_class('NSString') is classes['NSString']
+    assert client.objc_get_classes(['NSString'])['NSString'] is classes['NSString']
+
+    # a second lookup returns the same class objects and still omits the missing names
+    again = client.objc_get_classes(['NSObject', 'NSString', 'NoSuchClassName'])
+    assert again == classes
+    assert all(again[name] is classes[name] for name in classes)
+
+
+def test_objc_get_classes_long_name(client):
+    """
+    :param rpcclient.darwin.client.DarwinClient client:
+    """
+    classes = client.objc_get_classes(['A' * 0x1000, 'NSObject'])
+    assert list(classes) == ['NSObject']
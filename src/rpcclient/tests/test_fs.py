@@ -1,5 +1,9 @@
 from stat import S_IMODE
 
+import pytest
+
+from rpcclient.exceptions import ArgumentError, RpcFileNotFoundError
+
 
 def test_chown(client, tmp_path):
     file = (tmp_path / 'temp.txt')
@@ -113,3 +117,147 @@ def test_walk(client, tmp_path):
         assert client.fs.dictxattr(tmp_path) == {'KEY': b'VALUE'}
         client.fs.removexattr(tmp_path, 'KEY')
         assert client.fs.listxattr(tmp_path) == []
+
+
+def test_file_read_to_eof(client, tmp_path):
+    data = bytes(range(256)) * 1024 + b'tail'
+    client.fs.write_file(tmp_path / 'temp.bin', data)
+    with client.fs.open(tmp_path / 'temp.bin', 'r') as f:
+        assert f.read() == data
+        assert f.read() == b''
+
+
+def test_file_read_bounded(client, tmp_path):
+    data = bytes(range(256)) * 1024
+    client.fs.write_file(tmp_path / 'temp.bin', data)
+    with client.fs.open(tmp_path / 'temp.bin', 'r') as f:
+        assert f.read(1000) == data[:1000]
+        assert f.read(0x30005, chunk_size=0x1000) == data[1000:1000 + 0x30005]
+        assert f.tell() == 1000 + 0x30005
+        assert f.read(len(data)) == data[1000 + 0x30005:]
+
+
+def test_file_read_smaller_than_chunk(client, tmp_path):
+    client.fs.write_file(tmp_path / 'temp.txt', b'hello')
+    with client.fs.open(tmp_path / 'temp.txt', 'r') as f:
+        assert f.read() == b'hello'
+
+
+def _sorted_walk(walk):
+    return [(root, sorted(dirs), sorted(files)) for root, dirs, files in walk]
+
+
+def test_walk_bottom_up(client, tmp_path):
+    client.fs.mkdir(tmp_path / 'dir_a')
+    client.fs.mkdir(tmp_path / 'dir_a' / 'dir_b')
+    client.fs.touch(tmp_path / 'dir_a' / 'a1.txt')
+    client.fs.touch(tmp_path / 'dir_a' / 'dir_b' / 'b1.txt')
+
+    assert _sorted_walk(client.fs.walk(tmp_path, topdown=False)) == [
+        (f'{tmp_path}/dir_a/dir_b', [], ['b1.txt']),
+        (f'{tmp_path}/dir_a', ['dir_b'], ['a1.txt']),
+        (f'{tmp_path}', ['dir_a'], []),
+    ]
+
+
+def test_walk_deeper_than_prefetch(client, tmp_path):
+    depth = client.fs.WALK_PREFETCH_DEPTH * 3 + 2
+    path = tmp_path
+    for i in range(depth):
+        path = path / f'dir_{i}'
+        client.fs.mkdir(path)
+    client.fs.touch(path / 'leaf.txt')
+
+    result = _sorted_walk(client.fs.walk(tmp_path))
+    assert len(result) == depth + 1
+    assert result[-1] == (str(path), [], ['leaf.txt'])
+
+
+def test_walk_prune(client, tmp_path):
+    client.fs.mkdir(tmp_path / 'dir_a')
+    client.fs.mkdir(tmp_path / 'dir_a' / 'dir_b')
+    client.fs.mkdir(tmp_path / 'dir_c')
+
+    roots = []
+    for root, dirs, files in client.fs.walk(tmp_path):
+        roots.append(root)
+        if 'dir_a' in dirs:
+            dirs.remove('dir_a')
+    assert sorted(roots) == [f'{tmp_path}', f'{tmp_path}/dir_c']
+
+
+def test_walk_symlinked_dir(client, tmp_path):
+    client.fs.mkdir(tmp_path / 'dir_a')
+    client.fs.touch(tmp_path / 'dir_a' / 'a1.txt')
+    client.fs.symlink(tmp_path / 'dir_a', tmp_path / 'link')
+
+    assert sorted(_sorted_walk(client.fs.walk(tmp_path))) == [
+        (f'{tmp_path}', ['dir_a', 'link'], []),
+        (f'{tmp_path}/dir_a', [], ['a1.txt']),
+        (f'{tmp_path}/link', [], ['a1.txt']),
+    ]
+
+
+def test_read_file_into_bytearray(client, tmp_path):
+    data = bytes(range(256)) * 64
+    client.fs.write_file(tmp_path / 'temp.bin', data)
+    buf = bytearray(b'prefix')
+    client.fs.read_file_into(tmp_path / 'temp.bin', buf, chunk_size=0x1000)
+    assert buf == b'prefix' + data
+
+
+def test_read_file_into_local_file(client, tmp_path, tmpdir):
+    data = bytes(range(256)) * 64
+    client.fs.write_file(tmp_path / 'temp.bin', data)
+    local = tmpdir / 'temp.bin'
+    with open(local, 'wb') as f:
+        client.fs.read_file_into(tmp_path / 'temp.bin', f, chunk_size=0x1000)
+    with open(local, 'rb') as f:
+        assert f.read() == data
+
+
+def test_read_file_into_write_error(client, tmp_path):
+    class FailingWriter:
+        def write(self, buf):
+            raise OSError('local write failed')
+
+    data = bytes(range(256)) * 64
+    client.fs.write_file(tmp_path / 'temp.bin', data)
+    with pytest.raises(OSError):
+        client.fs.read_file_into(tmp_path / 'temp.bin', FailingWriter(), chunk_size=0x1000)
+    # the rest of the file is drained, so the connection remains usable
+    assert client.fs.read_file(tmp_path / 'temp.bin') == data
+
+
+def test_file_default_chunk_size(client, tmp_path):
+    data = bytes(range(256)) * 1024
+    with client.fs.open(tmp_path / 'temp.bin', 'w') as f:
+        f.write(data, chunk_size=0)
+        with pytest.raises(ArgumentError):
+            f.write(data, chunk_size=-1)
+    with client.fs.open(tmp_path / 'temp.bin', 'r') as f:
+        assert f.read(chunk_size=0) == data
+        with pytest.raises(ArgumentError):
+            f.read(chunk_size=-1)
+    assert client.fs.read_file(tmp_path / 'temp.bin', chunk_size=0) == data
+
+
+def test_file_chunk_size_limit(client, tmp_path):
+    chunk_size = client.MAX_FILE_CHUNK_SIZE + 1
+    with pytest.raises(ArgumentError):
+        client.fs.write_file(tmp_path / 'temp.bin', b'data', chunk_size=chunk_size)
+    client.fs.write_file(tmp_path / 'temp.bin', b'data')
+    with pytest.raises(ArgumentError):
+        client.fs.read_file(tmp_path / 'temp.bin', chunk_size=chunk_size)
+    # the connection remains usable after the rejected requests
+    assert client.fs.read_file(tmp_path / 'temp.bin', chunk_size=client.MAX_FILE_CHUNK_SIZE) == b'data'
+
+
+def test_scandir_dangling_symlink(client, tmp_path):
+    client.fs.symlink(tmp_path / 'missing', tmp_path / 'link')
+    entry = next(iter(client.fs.scandir(tmp_path)))
+    assert entry.is_symlink()
+    entry.stat(follow_symlinks=False)
+    with pytest.raises(RpcFileNotFoundError) as e:
+        entry.stat()
+    assert entry.path in str(e.value)
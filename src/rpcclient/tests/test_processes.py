@@ -1,3 +1,6 @@
+import pytest
+
+from rpcclient.exceptions import ArgumentError
 from rpcclient.protocol import DEFAULT_PORT
 
 LAUNCHD_PID = 1
@@ -16,3 +19,43 @@ def test_get_process_by_listening_port(client):
     # there should only be one process listening on this port and that's us
     worker_process = client.processes.get_by_pid(client.pid)
     assert client.processes.get_process_by_listening_port(DEFAULT_PORT).pid == worker_process.ppid
+
+
+def test_invalidate_fds(client, tmp_path):
+    process = client.processes.get_by_pid(client.pid)
+    fds_count = len(process.fds)
+    with client.fs.open(tmp_path / 'test', 'w'):
+        # fds are cached until explicitly invalidated
+        assert fds_count == len(process.fds)
+        process.invalidate_fds()
+        assert fds_count + 1 == len(process.fds)
+
+
+def test_get_by_pid(client):
+    assert client.processes.get_by_pid(LAUNCHD_PID).path == LAUNCHD_PATH
+    with pytest.raises(ArgumentError):
+        client.processes.get_by_pid(0x7fffffff)
+    with pytest.raises(ArgumentError):
+        client.processes.get_by_pid(-1)
+
+
+def test_listening_ports(client):
+    server_process = client.processes.get_by_pid(client.processes.get_by_pid(client.pid).ppid)
+    assert DEFAULT_PORT in server_process.listening_ports()
+
+
+def test_iter_processes(client):
+    for p in client.processes.iter_processes():
+        if p.pid == LAUNCHD_PID:
+            assert p.path == LAUNCHD_PATH
+            break
+    else:
+        assert False, 'launchd not found'
+
+
+def test_peek_many(client):
+    process = client.processes.get_by_pid(client.pid)
+    with client.safe_malloc(0x100) as peekable:
+        peekable.poke(b'hello\x00world\x00')
+        assert process.peek_many([(peekable, 5), (0, 0x10), (peekable + 6, 5)]) == [b'hello', None, b'world']
+        assert process.peek_strs([peekable, peekable + 6]) == {peekable: 'hello', peekable + 6: 'world'}
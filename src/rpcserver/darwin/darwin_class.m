@@ -49,3 +49,83 @@ error:
     TRACE("Failed to show class");
     return -1;
 }
+
+#define MAX_CLASS_NAME_LEN (1024)
+
+static bool recv_class_address(int sockfd, u64 *address)
+{
+    bool result = false;
+    char name[MAX_CLASS_NAME_LEN + 1];
+    u32 name_len;
+    CHECK(recvall(sockfd, (char *)&name_len, sizeof(name_len)));
+
+    *address = 0;
+    if (name_len > MAX_CLASS_NAME_LEN)
+    {
+        // no class has such a long name, but it must still be consumed to keep the protocol in sync
+        while (name_len)
+        {
+            u32 nbytes = name_len < MAX_CLASS_NAME_LEN ? name_len : MAX_CLASS_NAME_LEN;
+            CHECK(recvall(sockfd, name, nbytes));
+            name_len -= nbytes;
+        }
+    }
+    else
+    {
+        CHECK(recvall(sockfd, name, name_len));
+        name[name_len] = '\0';
+
+        // classes which don't exist are reported as 0
+        *address = (u64)objc_getClass(name);
+    }
+
+    result = true;
+
+error:
+    return result;
+}
+
+int handle_objc_get_classes(int sockfd)
+{
+    TRACE("Entered objc_get_classes");
+    int result = -1;
+    u64 *addresses = NULL;
+    u64 address;
+    cmd_objc_get_classes_t cmd;
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+
+    addresses = calloc(cmd.count ? cmd.count : 1, sizeof(u64));
+    if (!addresses)
+    {
+        // drain the names and report every class as missing, so the client isn't left waiting for a reply
+        TRACE("failed to allocate addresses for %u classes", cmd.count);
+        for (u32 i = 0; i < cmd.count; ++i)
+        {
+            CHECK(recv_class_address(sockfd, &address));
+        }
+        address = 0;
+        for (u32 i = 0; i < cmd.count; ++i)
+        {
+            CHECK(sendall(sockfd, (const char *)&address, sizeof(address)));
+        }
+        result = 0;
+        goto error;
+    }
+
+    for (u32 i = 0; i < cmd.count; ++i)
+    {
+        CHECK(recv_class_address(sockfd, &addresses[i]));
+    }
+
+    TRACE("Sending response");
+    CHECK(sendall(sockfd, (const char *)addresses, cmd.count * sizeof(u64)));
+    TRACE("Sent response");
+    result = 0;
+
+error:
+    if (addresses)
+    {
+        free(addresses);
+    }
+    return result;
+}
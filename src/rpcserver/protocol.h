@@ -4,10 +4,11 @@
 
 #include "common.h"
 
-#define SERVER_MAGIC_VERSION (0x88888806)
+#define SERVER_MAGIC_VERSION (0x8888880C)
 #define HANDSHAKE_SYSNAME_LEN (256)
 #define HANDSHAKE_MACHINE_LEN (256)
 #define MAX_PATH_LEN (1024)
+#define MAX_PEEK_MANY_REGIONS (0x10000)
 
 typedef enum
 {
@@ -25,7 +26,15 @@ typedef enum
     CMD_REPLY_POKE = 11,
     CMD_LISTDIR = 12,
     CMD_SHOWOBJECT = 13,
-    CMD_SHOWCLASS = 14
+    CMD_SHOWCLASS = 14,
+    CMD_READ_FILE = 15,
+    CMD_REPLY_READ_FILE = 16,
+    CMD_WRITE_FILE = 17,
+    CMD_REPLY_WRITE_FILE = 18,
+    CMD_WALK = 19,
+    CMD_DYLD_LIST = 20,
+    CMD_OBJC_GET_CLASSES = 21,
+    CMD_PEEK_MANY = 22,
 } cmd_type_t;
 
 typedef enum
@@ -112,6 +121,12 @@ typedef struct
     u64 size;
 } cmd_peek_t;
 
+typedef struct
+{
+    u64 count;
+    cmd_peek_t regions[0];
+} cmd_peek_many_t;
+
 typedef struct
 {
     u64 address;
@@ -154,6 +169,21 @@ typedef struct
     char name[0];
 } listdir_entry_t;
 
+typedef struct
+{
+    char filename[MAX_PATH_LEN];
+    u64 depth;
+} cmd_walk_t;
+
+typedef struct
+{
+    u64 magic;
+    u64 errno1;
+    u64 pathlen;
+
+    char path[0];
+} walk_dir_t;
+
 typedef struct
 {
     uint64_t address;
@@ -164,4 +194,25 @@ typedef struct
     uint64_t address;
 } cmd_showclass_t;
 
+typedef struct
+{
+    u32 count;
+    // followed by count names, each prefixed by its u32 length
+} cmd_objc_get_classes_t;
+
+typedef struct
+{
+    char filename[MAX_PATH_LEN];
+    u64 chunk_size;
+} cmd_read_file_t;
+
+typedef struct
+{
+    char filename[MAX_PATH_LEN];
+    u64 access;
+    u64 chunk_size;
+    u64 size;
+    u8 data[0];
+} cmd_write_file_t;
+
 #endif // __PROTOCOL_H_
\ No newline at end of file
@@ -28,13 +28,16 @@
 
 int handle_showobject(int sockfd);
 int handle_showclass(int sockfd);
+int handle_objc_get_classes(int sockfd);
 
 #ifdef __APPLE__
 #include <CoreFoundation/CoreFoundation.h>
 #include <mach/mach.h>
+#include <mach-o/dyld.h>
 #else
 int handle_showobject(int sockfd) { return 0; }
 int handle_showclass(int sockfd) { return 0; }
+int handle_objc_get_classes(int sockfd) { return 0; }
 #endif // __APPLE__
 
 #include "common.h"
@@ -53,6 +56,7 @@ Example usage: \n\
 
 #define MAX_OPTION_LEN (256)
 #define BUFFERSIZE (64 * 1024)
+#define MAX_CHUNK_SIZE (16 * 1024 * 1024)
 #define INVALID_PID (0xffffffff)
 #define WORKER_CLIENT_SOCKET_FD (3)
 
@@ -777,53 +781,111 @@ error:
     return result;
 }
 
-bool handle_peek(int sockfd)
+bool send_peek_reply(int sockfd, u64 address, u64 size)
 {
-    TRACE("enter");
-    s64 err = 0;
-    int result = false;
-    u64 *argv = NULL;
-    cmd_peek_t cmd;
+    bool result = false;
 
 #ifdef __APPLE__
     mach_port_t task;
     vm_offset_t data = 0;
-    mach_msg_type_number_t size;
+    mach_msg_type_number_t data_size;
 
-    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+    // verify the region is readable before sending it
     CHECK(task_for_pid(mach_task_self(), getpid(), &task) == KERN_SUCCESS);
-    if (vm_read(task, cmd.address, cmd.size, &data, &size) == KERN_SUCCESS)
+    if (vm_read(task, address, size, &data, &data_size) == KERN_SUCCESS)
     {
         CHECK(send_reply(sockfd, CMD_REPLY_PEEK));
-        CHECK(sendall(sockfd, (char *)cmd.address, cmd.size));
+        CHECK(sendall(sockfd, (char *)address, size));
     }
     else
     {
         CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
     }
 #else  // __APPLE__
-    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
     CHECK(send_reply(sockfd, CMD_REPLY_PEEK));
-    CHECK(sendall(sockfd, (char *)cmd.address, cmd.size));
+    CHECK(sendall(sockfd, (char *)address, size));
 #endif // __APPLE__
 
     result = true;
 
 error:
-    if (argv)
-    {
-        free(argv);
-    }
-
 #ifdef __APPLE__
     if (data)
     {
-        vm_deallocate(task, data, size);
+        vm_deallocate(task, data, data_size);
     }
 #endif // __APPLE__
     return result;
 }
 
+bool handle_peek(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+    cmd_peek_t cmd;
+
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+    CHECK(send_peek_reply(sockfd, cmd.address, cmd.size));
+
+    result = true;
+
+error:
+    return result;
+}
+
+bool handle_peek_many(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+    cmd_peek_t *regions = NULL;
+    cmd_peek_many_t cmd;
+
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+
+    if (cmd.count)
+    {
+        // bounding count also keeps the size of the regions array from overflowing
+        if (cmd.count <= MAX_PEEK_MANY_REGIONS)
+        {
+            regions = malloc(cmd.count * sizeof(cmd_peek_t));
+        }
+
+        if (!regions)
+        {
+            // drain the regions and fail each of them, so the client still gets a reply per region
+            TRACE("failed to allocate %lu regions", cmd.count);
+            cmd_peek_t region;
+            for (u64 i = 0; i < cmd.count; ++i)
+            {
+                CHECK(recvall(sockfd, (char *)&region, sizeof(region)));
+            }
+            for (u64 i = 0; i < cmd.count; ++i)
+            {
+                CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
+            }
+            result = true;
+            goto error;
+        }
+
+        CHECK(recvall(sockfd, (char *)regions, cmd.count * sizeof(cmd_peek_t)));
+    }
+
+    // each region is replied to separately, so a single unreadable region doesn't fail the others
+    for (u64 i = 0; i < cmd.count; ++i)
+    {
+        CHECK(send_peek_reply(sockfd, regions[i].address, regions[i].size));
+    }
+
+    result = true;
+
+error:
+    if (regions)
+    {
+        free(regions);
+    }
+    return result;
+}
+
 bool handle_poke(int sockfd)
 {
     TRACE("enter");
@@ -894,6 +956,82 @@ bool handle_get_dummy_block(int sockfd)
 
 #endif // __APPLE__
 
+bool send_listdir_entry(int sockfd, const char *dirname, struct dirent *direntp)
+{
+    bool result = false;
+    struct stat system_lstat = {0};
+    struct stat system_stat = {0};
+
+    char fullpath[FILENAME_MAX];
+    int len = snprintf(fullpath, sizeof(fullpath), "%s/%s", dirname, direntp->d_name);
+    CHECK(len > 0);
+
+    u64 lstat_error = 0;
+    u64 stat_error = 0;
+
+    if (len >= sizeof(fullpath)) {
+        // the entry is still listed, but can't be stat'ed
+        lstat_error = ENAMETOOLONG;
+        stat_error = ENAMETOOLONG;
+    } else {
+        if (lstat(fullpath, &system_lstat)) {
+            lstat_error = errno;
+        }
+        if (stat(fullpath, &system_stat)) {
+            stat_error = errno;
+        }
+    }
+
+    listdir_entry_t entry = {
+        .magic = MAGIC,
+        .type = direntp->d_type,
+
+#ifdef __APPLE__
+        .namelen = direntp->d_namlen,
+#else
+        .namelen = strlen(direntp->d_name),
+#endif
+
+        .lstat.errno1 = lstat_error,
+        .lstat.st_dev = system_lstat.st_dev,
+        .lstat.st_mode = system_lstat.st_mode,
+        .lstat.st_nlink = system_lstat.st_nlink,
+        .lstat.st_ino = system_lstat.st_ino,
+        .lstat.st_uid = system_lstat.st_uid,
+        .lstat.st_gid = system_lstat.st_gid,
+        .lstat.st_rdev = system_lstat.st_rdev,
+        .lstat.st_size = system_lstat.st_size,
+        .lstat.st_blocks = system_lstat.st_blocks,
+        .lstat.st_blksize = system_lstat.st_blksize,
+        .lstat.st_atime1 = system_lstat.st_atime,
+        .lstat.st_mtime1 = system_lstat.st_mtime,
+        .lstat.st_ctime1 = system_lstat.st_ctime,
+
+        .stat.errno1 = stat_error,
+        .stat.st_dev = system_stat.st_dev,
+        .stat.st_mode = system_stat.st_mode,
+        .stat.st_nlink = system_stat.st_nlink,
+        .stat.st_ino = system_stat.st_ino,
+        .stat.st_uid = system_stat.st_uid,
+        .stat.st_gid = system_stat.st_gid,
+        .stat.st_rdev = system_stat.st_rdev,
+        .stat.st_size = system_stat.st_size,
+        .stat.st_blocks = system_stat.st_blocks,
+        .stat.st_blksize = system_stat.st_blksize,
+        .stat.st_atime1 = system_stat.st_atime,
+        .stat.st_mtime1 = system_stat.st_mtime,
+        .stat.st_ctime1 = system_stat.st_ctime,
+    };
+
+    CHECK(sendall(sockfd, (const char *)&entry, sizeof(entry)));
+    CHECK(sendall(sockfd, direntp->d_name, entry.namelen));
+
+    result = true;
+
+error:
+    return result;
+}
+
 bool handle_listdir(int sockfd)
 {
     TRACE("enter");
@@ -923,78 +1061,332 @@ bool handle_listdir(int sockfd)
             break;
         }
 
-        struct stat system_lstat = {0};
-        struct stat system_stat = {0};
+        CHECK(send_listdir_entry(sockfd, cmd.filename, direntp));
+    }
+
+    u64 wrong_magic = 0;
+    CHECK(sendall(sockfd, (const char *)&wrong_magic, sizeof(wrong_magic)));
 
-        char fullpath[FILENAME_MAX];
-        CHECK(0 < sprintf(fullpath, "%s/%s", cmd.filename, direntp->d_name));
+    TRACE("sent magic");
 
-        u64 lstat_error = 0;
-        u64 stat_error = 0;
+    result = true;
 
-        if (!lstat(fullpath, &system_lstat)) {
-            lstat_error = errno;
+error:
+    if (dirp)
+    {
+        closedir(dirp);
+    }
+
+    return result;
+}
+
+bool is_dot_entry(const char *name)
+{
+    return (0 == strcmp(name, ".")) || (0 == strcmp(name, ".."));
+}
+
+bool walk_dir(int sockfd, const char *path, u64 depth)
+{
+    TRACE("enter: %s", path);
+    bool result = false;
+    DIR *dirp = NULL;
+    struct dirent *direntp = NULL;
+    walk_dir_t header = {.magic = MAGIC, .errno1 = 0, .pathlen = strlen(path)};
+
+    dirp = opendir(path);
+    if (!dirp)
+    {
+        header.errno1 = errno;
+    }
+
+    CHECK(sendall(sockfd, (const char *)&header, sizeof(header)));
+    CHECK(sendall(sockfd, path, header.pathlen));
+
+    if (!dirp)
+    {
+        TRACE("invalid dir");
+        result = true;
+        goto error;
+    }
+
+    while (1)
+    {
+        errno = 0;
+        direntp = readdir(dirp);
+        if (!direntp)
+        {
+            CHECK(errno == 0);
+            break;
         }
-        if (!stat(fullpath, &system_stat)) {
-            stat_error = errno;
+
+        if (is_dot_entry(direntp->d_name))
+        {
+            continue;
         }
 
-        listdir_entry_t entry = {
-            .magic = MAGIC,
-            .type = direntp->d_type,
+        CHECK(send_listdir_entry(sockfd, path, direntp));
+    }
+
+    u64 wrong_magic = 0;
+    CHECK(sendall(sockfd, (const char *)&wrong_magic, sizeof(wrong_magic)));
+
+    if (depth)
+    {
+        size_t pathlen = strlen(path);
+        const char *separator = (pathlen && path[pathlen - 1] == '/') ? "" : "/";
+
+        rewinddir(dirp);
+        while (1)
+        {
+            errno = 0;
+            direntp = readdir(dirp);
+            if (!direntp)
+            {
+                CHECK(errno == 0);
+                break;
+            }
+
+            if (is_dot_entry(direntp->d_name))
+            {
+                continue;
+            }
+
+            char subdir[FILENAME_MAX];
+            int len = snprintf(subdir, sizeof(subdir), "%s%s%s", path, separator, direntp->d_name);
+            if (len < 0 || len >= sizeof(subdir))
+            {
+                // left for the client to list on its own
+                continue;
+            }
+
+            // symlinks aren't followed. the client lists their targets separately if needed
+            struct stat st;
+            if (DT_DIR == direntp->d_type ||
+                (DT_UNKNOWN == direntp->d_type && !lstat(subdir, &st) && S_ISDIR(st.st_mode)))
+            {
+                CHECK(walk_dir(sockfd, subdir, depth - 1));
+            }
+        }
+    }
+
+    result = true;
+
+error:
+    if (dirp)
+    {
+        closedir(dirp);
+    }
+
+    return result;
+}
+
+bool handle_dyld_list(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+    u32 count = 0;
 
 #ifdef __APPLE__
-            .namelen = direntp->d_namlen,
-#else
-            .namelen = strlen(direntp->d_name),
-#endif
+    count = _dyld_image_count();
+#endif // __APPLE__
+
+    CHECK(sendall(sockfd, (const char *)&count, sizeof(count)));
 
-            .lstat.errno1 = lstat_error,
-            .lstat.st_dev = system_lstat.st_dev,
-            .lstat.st_mode = system_lstat.st_mode,
-            .lstat.st_nlink = system_lstat.st_nlink,
-            .lstat.st_ino = system_lstat.st_ino,
-            .lstat.st_uid = system_lstat.st_uid,
-            .lstat.st_gid = system_lstat.st_gid,
-            .lstat.st_rdev = system_lstat.st_rdev,
-            .lstat.st_size = system_lstat.st_size,
-            .lstat.st_blocks = system_lstat.st_blocks,
-            .lstat.st_blksize = system_lstat.st_blksize,
-            .lstat.st_atime1 = system_lstat.st_atime,
-            .lstat.st_mtime1 = system_lstat.st_mtime,
-            .lstat.st_ctime1 = system_lstat.st_ctime,
-
-            .stat.errno1 = stat_error,
-            .stat.st_dev = system_stat.st_dev,
-            .stat.st_mode = system_stat.st_mode,
-            .stat.st_nlink = system_stat.st_nlink,
-            .stat.st_ino = system_stat.st_ino,
-            .stat.st_uid = system_stat.st_uid,
-            .stat.st_gid = system_stat.st_gid,
-            .stat.st_rdev = system_stat.st_rdev,
-            .stat.st_size = system_stat.st_size,
-            .stat.st_blocks = system_stat.st_blocks,
-            .stat.st_blksize = system_stat.st_blksize,
-            .stat.st_atime1 = system_stat.st_atime,
-            .stat.st_mtime1 = system_stat.st_mtime,
-            .stat.st_ctime1 = system_stat.st_ctime,
-        };
-
-        CHECK(sendall(sockfd, (const char *)&entry, sizeof(entry)));
-        CHECK(sendall(sockfd, direntp->d_name, entry.namelen));
+#ifdef __APPLE__
+    for (u32 i = 0; i < count; ++i)
+    {
+        // the image may have been unloaded since counting. it is then sent as an empty name
+        const char *name = _dyld_get_image_name(i);
+        u32 len = name ? strlen(name) : 0;
+        CHECK(sendall(sockfd, (const char *)&len, sizeof(len)));
+        if (len)
+        {
+            CHECK(sendall(sockfd, name, len));
+        }
     }
+#endif // __APPLE__
+
+    result = true;
+
+error:
+    return result;
+}
+
+bool handle_walk(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+
+    cmd_walk_t cmd;
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+
+    CHECK(walk_dir(sockfd, cmd.filename, cmd.depth));
 
+    // a header with a wrong magic marks the end of the walk
     u64 wrong_magic = 0;
     CHECK(sendall(sockfd, (const char *)&wrong_magic, sizeof(wrong_magic)));
 
-    TRACE("sent magic");
+    result = true;
+
+error:
+    return result;
+}
+
+bool handle_read_file(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+    int fd = -1;
+    char *buf = NULL;
+
+    cmd_read_file_t cmd;
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+
+    size_t chunk_size = cmd.chunk_size ? cmd.chunk_size : BUFFERSIZE;
+    if (chunk_size > MAX_CHUNK_SIZE)
+    {
+        chunk_size = MAX_CHUNK_SIZE;
+    }
+
+    buf = malloc(chunk_size);
+    if (!buf)
+    {
+        TRACE("failed to allocate chunk of size: %zu", chunk_size);
+        CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
+        result = true;
+        goto error;
+    }
+
+    fd = open(cmd.filename, O_RDONLY);
+    if (-1 == fd)
+    {
+        TRACE("failed to open: %s", cmd.filename);
+        CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
+        result = true;
+        goto error;
+    }
+
+    while (true)
+    {
+        ssize_t nbytes = read(fd, buf, chunk_size);
+        if (nbytes < 0)
+        {
+            TRACE("failed to read: %s", cmd.filename);
+            CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
+            break;
+        }
+
+        // each chunk is sent as a reply followed by its size. an empty chunk marks EOF
+        u64 size = nbytes;
+        CHECK(send_reply(sockfd, CMD_REPLY_READ_FILE));
+        CHECK(sendall(sockfd, (const char *)&size, sizeof(size)));
+        if (0 == size)
+        {
+            break;
+        }
+        CHECK(sendall(sockfd, buf, size));
+    }
 
     result = true;
 
 error:
-    if (dirp)
+    if (-1 != fd)
     {
-        closedir(dirp);
+        close(fd);
+    }
+    if (buf)
+    {
+        free(buf);
+    }
+
+    return result;
+}
+
+bool handle_write_file(int sockfd)
+{
+    TRACE("enter");
+    bool result = false;
+    int fd = -1;
+    int write_errno = 0;
+    char *buf = NULL;
+    char drain_buf[1024];
+
+    cmd_write_file_t cmd;
+    CHECK(recvall(sockfd, (char *)&cmd, sizeof(cmd)));
+
+    size_t chunk_size = cmd.chunk_size ? cmd.chunk_size : BUFFERSIZE;
+    if (chunk_size > MAX_CHUNK_SIZE)
+    {
+        chunk_size = MAX_CHUNK_SIZE;
+    }
+    if (cmd.size && chunk_size > cmd.size)
+    {
+        chunk_size = cmd.size;
+    }
+
+    buf = malloc(chunk_size);
+    if (!buf)
+    {
+        // the payload is still drained below, through a small stack buffer
+        TRACE("failed to allocate chunk of size: %zu", chunk_size);
+        write_errno = errno;
+    }
+    else
+    {
+        fd = open(cmd.filename, O_RDWR | O_CREAT, cmd.access);
+        if (-1 == fd)
+        {
+            TRACE("failed to open: %s", cmd.filename);
+            write_errno = errno;
+        }
+    }
+
+    char *chunk = buf ? buf : drain_buf;
+    if (!buf)
+    {
+        chunk_size = sizeof(drain_buf);
+    }
+
+    // the payload must always be consumed to keep the protocol in sync, even if the file couldn't be written
+    while (cmd.size)
+    {
+        size_t nbytes = cmd.size < chunk_size ? cmd.size : chunk_size;
+        CHECK(recvall(sockfd, chunk, nbytes));
+        if (!write_errno && !writeall(fd, chunk, nbytes))
+        {
+            TRACE("failed to write: %s", cmd.filename);
+            write_errno = errno;
+        }
+        cmd.size -= nbytes;
+    }
+
+    if (-1 != fd)
+    {
+        close(fd);
+        fd = -1;
+    }
+
+    if (write_errno)
+    {
+        // restore errno so the client may query the failure reason
+        errno = write_errno;
+        CHECK(send_reply(sockfd, CMD_REPLY_ERROR));
+    }
+    else
+    {
+        CHECK(send_reply(sockfd, CMD_REPLY_WRITE_FILE));
+    }
+
+    result = true;
+
+error:
+    if (-1 != fd)
+    {
+        close(fd);
+    }
+    if (buf)
+    {
+        free(buf);
     }
 
     return result;
@@ -1091,6 +1483,36 @@ void handle_client(int sockfd)
             handle_showclass(sockfd);
             break;
         }
+        case CMD_READ_FILE:
+        {
+            handle_read_file(sockfd);
+            break;
+        }
+        case CMD_WRITE_FILE:
+        {
+            handle_write_file(sockfd);
+            break;
+        }
+        case CMD_WALK:
+        {
+            handle_walk(sockfd);
+            break;
+        }
+        case CMD_DYLD_LIST:
+        {
+            handle_dyld_list(sockfd);
+            break;
+        }
+        case CMD_OBJC_GET_CLASSES:
+        {
+            handle_objc_get_classes(sockfd);
+            break;
+        }
+        case CMD_PEEK_MANY:
+        {
+            handle_peek_many(sockfd);
+            break;
+        }
         default:
         {
             TRACE("unknown cmd: %d", cmd.cmd_type);